@@ -1,284 +1,516 @@
-import numpy as np
-import pandas as pd
-import tkinter as tk
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from tkinter import filedialog, messagebox 
-import sys
-from obspy import read
-import os
-from pathlib import Path
-from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
-
-
-# Global state variables
-global waveforms, labels, n, label_df, foldername, file_name, zoom_limits
-zoom_limits = {"xlim": None, "ylim": None}
-waveforms = []
-labels = []
-n = 0
-label_df = pd.DataFrame()
-foldername = ""
-file_name = ""
-current_index = 0
-label_exists = False
-
-# Helper function to load waveform data
-def load_waveform_data(path):
-    global waveforms, labels, n, label_df, foldername, file_name, label_exists, current_index, filename
-
-    waveforms = []
-    label_names = []
-    label_exists = False
-
-    if os.path.isfile(path):
-        p = Path(path)
-        file_name = p.stem
-        run_num = p.parent.name
-        exp_name = p.parent.parent.name
-        st = read(path)
-        waveform = np.array([tr.data for tr in st])
-        waveforms = waveform
-        n = len(waveforms)
-        parts = file_name.split('_')
-        event_id = '_'.join(parts[:2])
-        trace_labels = np.array([f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}' for i in range(n)])
-        filename = f'{exp_name}_{run_num}_{event_id}'
-        try:
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            folder = 'picks_folder'
-            folder_path = os.path.join(script_dir, folder)
-            file_path = os.path.join(folder_path,f'p_picks_{filename}.csv')
-            label_df = pd.read_csv(file_path)
-            labels = label_df['marked_point'].to_numpy()
-            unlabeled = label_df[label_df['marked_point'] == -1]
-            current_index = unlabeled.index[0] if not unlabeled.empty else 0
-            label_exists = True
-        except:
-            labels = np.full(n, -1)
-            label_df = pd.DataFrame({'Name': trace_labels, 'marked_point': labels})
-
-
-    elif os.path.isdir(path):
-        foldername = os.path.basename(path)
-        file_name = foldername
-        try:
-            try:
-                label_df = pd.read_csv(f'p_picks_{foldername}.csv')
-                labels = label_df['marked_point'].to_numpy()
-                unlabeled = label_df[label_df['marked_point'] == -1]
-                current_index = unlabeled.index[0] if not unlabeled.empty else 0
-                label_exists = True
-            except:
-                print(f'No existing labels file found, creating a new one')
-
-            for root_dir, sub_dirs, files in os.walk(path):
-                for file_name in files:
-                    full_path = os.path.join(root_dir, file_name)
-                    try:
-                        st = read(full_path)
-                        print(f'Appended {full_path}')
-                        p = Path(full_path)
-                        run_num = p.parent.name
-                        exp_name = p.parent.parent.name
-                        file_base = p.stem
-                        parts = file_base.split('_')
-                        event_id = '_'.join(parts[:2])
-                        for i, tr in enumerate(st):
-                            waveforms.append(tr.data)
-                            if not label_exists:
-                                label_names.append(f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}')
-                    except Exception as e:
-                        print(f"Skipped {full_path}: {e}")
-            waveforms = np.array(waveforms, dtype=object)
-            n = len(waveforms)
-            if not label_exists:
-                labels = np.full(n, -1)
-                label_df = pd.DataFrame({'Name': label_names, 'marked_point': labels})
-
-        except Exception as e:
-            messagebox.showerror('Error opening folder', f'Unable to open {path}, Error: {str(e)}')
-
-# Initial file prompt
-root = tk.Tk()
-root.title('Waveform Labeling')
-root.geometry("1000x800")
-root.minsize(1000, 800)
-
-root.withdraw()
-top_frame = tk.Frame(root)
-top_frame.pack(fill='x', pady=10)
-
-file_label = tk.Label(top_frame, text="", wraplength=900, justify='center', font=("Arial", 12), fg="blue")
-file_label.pack(anchor='center', pady=(5, 10))
-
-path = filedialog.askdirectory(title='Select waveform file or folder')
-if not path:
-    messagebox.showwarning('No file selected', 'You must select a waveform file or folder.')
-    root.destroy()
-    sys.exit()
-else:
-    load_waveform_data(path)
-    file_label.config(text=f"Loaded: {file_name}")
-    root.deiconify()
-
-# Event and drawing logic
-def on_click(event):
-    global labels,current_index
-    if event.inaxes and event.xdata is not None:
-        ix = int(event.xdata)
-        labels[current_index] = ix
-        '''if current_index != len(waveforms)-1:
-            current_index += 1'''
-        redraw_plot()
-
-def go_to_index():
-    global current_index
-    try:
-        idx = int(goto_entry.get())
-        if 0 < idx <= n:
-            current_index = idx -1
-            redraw_plot()
-        else:
-            messagebox.showwarning("Invalid index", f"Please enter a number between 0 and {n-1}")
-    except ValueError:
-        messagebox.showwarning("Invalid input", "Please enter a valid integer")
-
-def redraw_plot():
-    global cursor_line, zoom_limits
-    ax.clear()
-    waveform = waveforms[current_index]
-    ax.plot(waveform, label='Waveform')
-    if labels[current_index] != -1:
-        ax.axvline(labels[current_index], color='red', linestyle='-', label='Marked Point')
-        cursor_line = ax.axvline(labels[current_index], color='red', linestyle='--', alpha=0.4)
-    else:
-        cursor_line = ax.axvline(0, color='red', linestyle='--', alpha=0.4)
-    ax.set_title(f"Waveform {current_index + 1}/{n}")
-    if zoom_limits["xlim"] or zoom_limits['ylim']:
-        ax.set_xlim(zoom_limits["xlim"])
-        ax.set_xlim(zoom_limits['ylim'])
-    else:
-        # Set default full view for x-axis and auto y-axis
-        ax.set_xlim(0, len(waveform))
-        ax.autoscale(axis='y')
-    canvas.draw()
-    update_button_states()
-
-def uploadfile():
-    global current_index
-    new_path = filedialog.askdirectory(title='Select waveform file or folder')
-    if new_path:
-        load_waveform_data(new_path)
-        current_index = 0
-        redraw_plot()
-        file_label.config(text=f"Loaded: {file_name}")
-
-
-def prev_waveform():
-    global current_index
-    if current_index > 0:
-        current_index -= 1
-        redraw_plot()
-
-def next_waveform():
-    global current_index
-    if current_index < n - 1:
-        current_index += 1
-        redraw_plot()
-
-def save_labels_csv():
-    global filename
-    filename1 = f'p_picks_{foldername}.csv' if os.path.isdir(path) else f'p_picks_{filename}.csv'
-    label_df['marked_point'] = labels
-
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    folder = 'picks_folder'
-    folder_path = os.path.join(script_dir, folder)
-    os.makedirs(folder_path, exist_ok=True)
-    file_path = os.path.join(folder_path,filename1)
-    label_df.to_csv(file_path, index=False)
-    messagebox.showinfo('File saved', f'Saved as {filename} at {folder_path}')
-
-def update_button_states():
-    prev_btn.config(state=tk.DISABLED if current_index <= 0 else tk.NORMAL)
-    next_btn.config(state=tk.DISABLED if current_index >= n - 1 else tk.NORMAL)
-
-def on_mouse_move(event):
-    global cursor_line
-    if event.inaxes and event.xdata is not None:
-        try:
-            cursor_line.set_xdata([event.xdata])
-            canvas.draw_idle()
-        except Exception as e:
-            print("Cursor update error:", e)
-
-def on_scroll(event):
-    global zoom_limits
-    if event.inaxes is None:
-        return
-    ax = event.inaxes
-    scale_factor = 1.2 if event.button == 'up' else 0.8
-
-    xlim = ax.get_xlim()
-    ylim = ax.get_ylim()
-    y_center = event.ydata
-    x_center = event.xdata
-    new_xlim = [x_center + (x - x_center) * scale_factor for x in xlim]
-    new_ylim = [y_center + (y - y_center) * scale_factor for y in xlim]
-    ax.set_xlim(new_xlim)
-    #ax.set_ylim(new_ylim)
-    zoom_limits['xlim'] = new_xlim
-    #zoom_limits['ylim'] = new_ylim
-    canvas.draw_idle()
-
-def on_close():
-    root.destroy()
-    sys.exit()
-
-root.protocol("WM_DELETE_WINDOW", on_close)
-
-# GUI Layout
-
-
-instruction_label = tk.Label(
-    top_frame,
-    text=f"Click on the waveform to mark a point of interest.\nUse Next/Previous to navigate. Save to export labels.",
-    justify='center', font=("Arial", 15), anchor='center')
-instruction_label.pack(anchor='center')
-fig, ax = plt.subplots()
-canvas = FigureCanvasTkAgg(fig, master=root)
-canvas_widget = canvas.get_tk_widget()
-canvas_widget.pack(fill='both', expand=True)
-canvas.mpl_connect('button_press_event', on_click)
-canvas.mpl_connect('motion_notify_event', on_mouse_move)
-
-controls = tk.Frame(root)
-controls.pack(fill='x', pady=10)
-
-prev_btn = tk.Button(controls, text="Previous", command=prev_waveform, width=12, height=2)
-prev_btn.pack(side=tk.LEFT, padx=5)
-
-next_btn = tk.Button(controls, text="Next", command=next_waveform, width=12, height=2)
-next_btn.pack(side=tk.LEFT, padx=5)
-
-save_btn = tk.Button(controls, text="Save", command=save_labels_csv, width=12, height=2)
-save_btn.pack(side=tk.LEFT, padx=5)
-
-file_btn = tk.Button(controls, text="Import File", command=uploadfile, width=12, height=2)
-file_btn.pack(side=tk.LEFT, padx=5)
-canvas.mpl_connect('scroll_event', on_scroll)
-
-goto_btn = tk.Button(controls, text="Go", command=go_to_index, width=6, height=2)
-goto_btn.pack(side=tk.LEFT, padx=5)
-
-goto_entry = tk.Entry(controls, width=6)
-goto_entry.pack(side=tk.LEFT, padx=5)
-toolbar = NavigationToolbar2Tk(canvas, root)
-toolbar.update()
-toolbar.pack(side=tk.TOP, fill=tk.X)
-
-
-redraw_plot()
-update_button_states()
-root.mainloop()
+import numpy as np
+import pandas as pd
+import tkinter as tk
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from tkinter import filedialog, messagebox 
+import sys
+import os
+from pathlib import Path
+import threading
+import queue
+from tkinter import ttk
+from matplotlib.backends.backend_tkagg import NavigationToolbar2Tk
+from waveform_io import (list_waveform_files, index_file, read_file_traces, read_stream, scan_corpus, LazyWaveforms,
+                         StreamCache, use_waveform_store, use_npy_cache)
+from waveform_plotting import MinMaxPyramid, axes_pixel_width, BlitManager
+from prefetch import Prefetcher, neighbour_keys
+from pick_journal import PickJournal
+from trace_buffer import TraceBuffer
+from waveform_filter import filter_traces, cached_filtered, use_filter_cache
+
+
+# Global state variables
+global waveforms, labels, n, label_df, foldername, file_name, zoom_limits
+zoom_limits = {"xlim": None, "ylim": None}
+waveforms = []
+labels = []
+n = 0
+label_df = pd.DataFrame()
+foldername = ""
+file_name = ""
+loaded_file = ""
+loaded_sampling_rates = []
+current_index = 0
+label_exists = False
+# Cursor and pick lines are blitted over a cached background of the waveform
+BLIT_CURSOR = True
+
+# Folder mode only indexes headers up front and decodes traces when they are shown,
+# set LAZY_LOADING to False to read every trace into memory at startup instead
+LAZY_LOADING = True
+STREAM_CACHE_SIZE = 16
+# Eager mode packs every trace into one TraceBuffer, None keeps the file dtype, np.float32 downcasts
+EAGER_DTYPE = None
+# HDF5 store built by `python waveform_store.py <data> <store.h5>`, samples are read out of it
+# instead of decoding .mseed. None reads the .mseed files
+WAVEFORM_STORE_PATH = None
+# Folder for memory-mapped .npy copies of decoded files so later reads skip mseed parsing, None disables them
+NPY_CACHE_DIR = None
+
+# Traces around the current one are decoded and decimated on a worker thread
+PREFETCH_NEXT = 3
+PREFETCH_PREV = 1
+DETREND_DISPLAY = False
+# Show the bandpassed copy the pickers use, e.g. {'freqmin': 20e3, 'freqmax': 200e3}, None shows raw samples.
+# With FILTER_CACHE_DIR set the pickers' filtered traces are shown from the cache,
+# otherwise the trace already decoded for display is filtered in memory.
+DISPLAY_FILTER = None
+# Folder for filtered .npy copies shared by the pickers and the GUI, None filters on every run
+FILTER_CACHE_DIR = None
+
+# Folder scans report back to the Tk loop through this queue
+LOADER_POLL_MS = 100
+# Files are read across this many processes, None uses every core
+SCAN_WORKERS = None
+loader_queue = queue.Queue()
+loader_state = {'files_done': 0, 'files_total': 0, 'failed': 0, 'loading': False}
+
+# Every click is appended to picks_folder/p_picks_*.journal and replayed on load,
+# Save compacts the journal into the csv
+JOURNAL_FSYNC = False
+journal = None
+label_names = []
+
+# Helper function to load waveform data
+def load_waveform_data(path):
+    global waveforms, labels, n, label_df, foldername, file_name, label_exists, current_index, filename, label_names, loaded_file, loaded_sampling_rates
+
+    waveforms = []
+    label_exists = False
+    prefetcher.clear()
+
+    if os.path.isfile(path):
+        p = Path(path)
+        file_name = p.stem
+        run_num = p.parent.name
+        exp_name = p.parent.parent.name
+        st = read_stream(path)
+        loaded_file = path
+        loaded_sampling_rates = [tr.stats.sampling_rate for tr in st]
+        waveform = np.array([tr.data for tr in st])
+        waveforms = waveform
+        n = len(waveforms)
+        parts = file_name.split('_')
+        event_id = '_'.join(parts[:2])
+        trace_labels = np.array([f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}' for i in range(n)])
+        filename = f'{exp_name}_{run_num}_{event_id}'
+        try:
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            folder = 'picks_folder'
+            folder_path = os.path.join(script_dir, folder)
+            file_path = os.path.join(folder_path,f'p_picks_{filename}.csv')
+            label_df = pd.read_csv(file_path)
+            labels = label_df['marked_point'].to_numpy()
+            unlabeled = label_df[label_df['marked_point'] == -1]
+            current_index = unlabeled.index[0] if not unlabeled.empty else 0
+            label_exists = True
+        except:
+            labels = np.full(n, -1)
+            label_df = pd.DataFrame({'Name': trace_labels, 'marked_point': labels})
+        label_names = label_df['Name'].tolist()
+        open_journal(path)
+        replay_journal()
+
+    elif os.path.isdir(path):
+        foldername = os.path.basename(path)
+        file_name = foldername
+        try:
+            try:
+                label_df = pd.read_csv(f'p_picks_{foldername}.csv')
+                labels = label_df['marked_point'].to_numpy()
+                unlabeled = label_df[label_df['marked_point'] == -1]
+                current_index = unlabeled.index[0] if not unlabeled.empty else 0
+                label_exists = True
+            except:
+                print(f'No existing labels file found, creating a new one')
+
+            if LAZY_LOADING:
+                waveforms = LazyWaveforms([], StreamCache(STREAM_CACHE_SIZE))
+            else:
+                waveforms = TraceBuffer(dtype=EAGER_DTYPE)
+            n = 0
+            open_journal(path)
+            if label_exists:
+                label_names = label_df['Name'].tolist()
+                replay_journal()
+            else:
+                label_names = []
+                labels = np.full(0, -1)
+            # The scan runs on a worker thread, poll_loader picks up its results
+            loader_state.update(files_done=0, files_total=0, failed=0, loading=True)
+            threading.Thread(target=folder_loader, args=(path, LAZY_LOADING, loader_queue), daemon=True).start()
+            root.after(LOADER_POLL_MS, poll_loader)
+
+        except Exception as e:
+            messagebox.showerror('Error opening folder', f'Unable to open {path}, Error: {str(e)}')
+
+# --- Background folder loading ---
+def folder_loader(path, lazy, results):
+    """
+    Worker thread: scans path file by file and queues the results for the Tk loop.
+    Never touches Tk itself.
+    """
+    try:
+        file_paths = list_waveform_files(path)
+        results.put(('total', len(file_paths)))
+        reader = index_file if lazy else read_file_traces
+        for full_path, result, error in scan_corpus(path, reader, SCAN_WORKERS, file_paths):
+            if error is not None:
+                results.put(('failed', full_path, error))
+                continue
+            entries, traces, sampling_rates = (result, None, None) if lazy else result
+            results.put(('file', full_path, entries, traces, sampling_rates))
+    except Exception as e:
+        results.put(('error', path, str(e)))
+        return
+    results.put(('done',))
+
+def poll_loader():
+    """
+    Runs on the Tk loop through root.after, appends whatever the worker has
+    loaded so the first traces are markable before the scan finishes.
+    """
+    global n, labels, label_df
+    previous_n = n
+    new_names = []
+    finished = False
+    while not loader_queue.empty():
+        message = loader_queue.get_nowait()
+        kind = message[0]
+        if kind == 'total':
+            loader_state['files_total'] = message[1]
+        elif kind == 'file':
+            _, full_path, entries, traces, sampling_rates = message
+            if LAZY_LOADING:
+                waveforms.trace_index.extend(entries)
+            else:
+                for entry, data, sampling_rate in zip(entries, traces, sampling_rates):
+                    waveforms.append(data, entry[2], sampling_rate, full_path, entry[1])
+            new_names.extend(entry[2] for entry in entries)
+            loader_state['files_done'] += 1
+            print(f'Appended {full_path}')
+        elif kind == 'failed':
+            loader_state['files_done'] += 1
+            loader_state['failed'] += 1
+            print(f"Skipped {message[1]}: {message[2]}")
+        elif kind == 'error':
+            finished = True
+            messagebox.showerror('Error opening folder', f'Unable to open {message[1]}, Error: {message[2]}')
+        elif kind == 'done':
+            finished = True
+
+    if new_names:
+        n = len(waveforms)
+        if not label_exists:
+            # an existing csv already supplied every name and label
+            label_names.extend(new_names)
+            labels = np.concatenate([labels, np.full(len(new_names), -1)])
+    update_progress()
+
+    if finished:
+        loader_state['loading'] = False
+        if not LAZY_LOADING:
+            waveforms.trim()
+        if not label_exists:
+            replay_journal()
+            label_df = pd.DataFrame({'Name': label_names, 'marked_point': labels})
+            # a replayed pick may belong to the trace on screen
+            if current_index < n:
+                redraw_plot()
+        update_progress()
+        update_button_states()
+    else:
+        root.after(LOADER_POLL_MS, poll_loader)
+
+    if previous_n <= current_index < n:
+        redraw_plot()
+    elif n != previous_n:
+        ax.set_title(f"Waveform {current_index + 1}/{n}")
+        canvas.draw_idle()
+        update_button_states()
+
+# --- Pick journal ---
+def open_journal(data_path):
+    global journal
+    if journal is not None:
+        journal.close()
+    stem = foldername if os.path.isdir(data_path) else filename
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    journal = PickJournal(os.path.join(script_dir, 'picks_folder', f'p_picks_{stem}.journal'), fsync=JOURNAL_FSYNC)
+
+def replay_journal():
+    applied = journal.replay(label_names, labels)
+    if applied:
+        print(f'Replayed {applied} picks from {journal.path}')
+
+def update_progress():
+    files_total = max(loader_state['files_total'], 1)
+    progress_bar['value'] = 100 * loader_state['files_done'] / files_total
+    status = 'Loading' if loader_state['loading'] else 'Loaded'
+    progress_label.config(text=f"{status}: {loader_state['files_done']}/{loader_state['files_total']} files, "
+                               f"{n} traces, {loader_state['failed']} failed")
+
+def prepare_trace(index):
+    if DISPLAY_FILTER:
+        full_path, trace_number = trace_location(index)
+        filtered = cached_filtered(full_path, DISPLAY_FILTER)
+        if filtered is not None:
+            data = filtered[trace_number].data
+        else:
+            data = filter_traces([waveforms[index]], trace_sampling_rate(index), DISPLAY_FILTER)[0]
+        return MinMaxPyramid(data, step=DISPLAY_FILTER.get('decimate', 1))
+    data = waveforms[index]
+    if DETREND_DISPLAY:
+        data = data - data.mean()
+    return MinMaxPyramid(data)
+
+def trace_location(index):
+    """
+    (file path, trace number) of trace index in whichever container is loaded.
+    """
+    if isinstance(waveforms, LazyWaveforms):
+        full_path, trace_number, _, _ = waveforms.trace_index[index]
+        return full_path, trace_number
+    if isinstance(waveforms, TraceBuffer):
+        return waveforms.file_paths[index], int(waveforms.trace_numbers[index])
+    return loaded_file, index
+
+def trace_sampling_rate(index):
+    """
+    Sampling rate of trace index in whichever container is loaded.
+    """
+    if isinstance(waveforms, LazyWaveforms):
+        full_path, trace_number, _, _ = waveforms.trace_index[index]
+        return waveforms.cache.get(full_path)[trace_number].stats.sampling_rate
+    if isinstance(waveforms, TraceBuffer):
+        return waveforms.sampling_rates[index]
+    return loaded_sampling_rates[index]
+
+# Event and drawing logic
+def on_click(event):
+    global labels,current_index
+    if event.inaxes and event.xdata is not None and current_index < n:
+        ix = int(event.xdata)
+        labels[current_index] = ix
+        journal.record(label_names[current_index], ix)
+        '''if current_index != len(waveforms)-1:
+            current_index += 1'''
+        pick_line.set_xdata([ix])
+        pick_line.set_visible(True)
+        blit_manager.update()
+
+def go_to_index():
+    global current_index
+    try:
+        idx = int(goto_entry.get())
+        if 0 < idx <= n:
+            current_index = idx -1
+            redraw_plot()
+        else:
+            messagebox.showwarning("Invalid index", f"Please enter a number between 0 and {n-1}")
+    except ValueError:
+        messagebox.showwarning("Invalid input", "Please enter a valid integer")
+
+def current_pyramid():
+    return prefetcher.get(current_index)
+
+def on_xlim_changed(axes):
+    if current_index >= n:
+        return
+    # Re-decimate for the new view so zooming in reveals the raw samples
+    waveform_line.set_data(*current_pyramid().view(axes.get_xlim(), axes_pixel_width(axes)))
+
+def redraw_plot():
+    global zoom_limits
+    if current_index >= n:
+        # the folder scan has not reached this trace yet, poll_loader redraws once it has
+        return
+    # Artists are created once below, navigation only swaps their data
+    pyramid = current_pyramid()
+    view_xlim = zoom_limits["xlim"] or (0, len(pyramid))
+    waveform_line.set_data(*pyramid.view(view_xlim, axes_pixel_width(ax)))
+    if labels[current_index] != -1:
+        pick_line.set_xdata([labels[current_index]])
+        pick_line.set_visible(True)
+        cursor_line.set_xdata([labels[current_index]])
+    else:
+        pick_line.set_visible(False)
+        cursor_line.set_xdata([0])
+    ax.set_title(f"Waveform {current_index + 1}/{n}")
+    if zoom_limits["xlim"] or zoom_limits['ylim']:
+        ax.set_xlim(zoom_limits["xlim"])
+        ax.set_xlim(zoom_limits['ylim'])
+    else:
+        # Set default full view for x-axis and auto y-axis
+        ax.set_xlim(0, len(pyramid))
+        ax.relim(visible_only=True)
+        ax.autoscale(axis='y')
+    canvas.draw()
+    update_button_states()
+    prefetcher.schedule(neighbour_keys(current_index, n, PREFETCH_NEXT, PREFETCH_PREV))
+
+def uploadfile():
+    global current_index
+    new_path = filedialog.askdirectory(title='Select waveform file or folder')
+    if new_path:
+        load_waveform_data(new_path)
+        current_index = 0
+        redraw_plot()
+        file_label.config(text=f"Loaded: {file_name}")
+
+
+def prev_waveform():
+    global current_index
+    if current_index > 0:
+        current_index -= 1
+        redraw_plot()
+
+def next_waveform():
+    global current_index
+    if current_index < n - 1:
+        current_index += 1
+        redraw_plot()
+
+def save_labels_csv():
+    global filename
+    filename1 = f'p_picks_{foldername}.csv' if os.path.isdir(path) else f'p_picks_{filename}.csv'
+    label_df['marked_point'] = labels
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    folder = 'picks_folder'
+    folder_path = os.path.join(script_dir, folder)
+    os.makedirs(folder_path, exist_ok=True)
+    file_path = os.path.join(folder_path,filename1)
+    label_df.to_csv(file_path, index=False)
+    # the csv now holds every journaled pick
+    journal.compact()
+    messagebox.showinfo('File saved', f'Saved as {filename} at {folder_path}')
+
+def update_button_states():
+    prev_btn.config(state=tk.DISABLED if current_index <= 0 else tk.NORMAL)
+    next_btn.config(state=tk.DISABLED if current_index >= n - 1 else tk.NORMAL)
+    # Labels are only complete once the folder scan has finished
+    save_btn.config(state=tk.DISABLED if loader_state['loading'] else tk.NORMAL)
+    file_btn.config(state=tk.DISABLED if loader_state['loading'] else tk.NORMAL)
+
+def on_mouse_move(event):
+    if event.inaxes and event.xdata is not None:
+        try:
+            cursor_line.set_xdata([event.xdata])
+            blit_manager.update()
+        except Exception as e:
+            print("Cursor update error:", e)
+
+def on_scroll(event):
+    global zoom_limits
+    if event.inaxes is None:
+        return
+    ax = event.inaxes
+    scale_factor = 1.2 if event.button == 'up' else 0.8
+
+    xlim = ax.get_xlim()
+    ylim = ax.get_ylim()
+    y_center = event.ydata
+    x_center = event.xdata
+    new_xlim = [x_center + (x - x_center) * scale_factor for x in xlim]
+    new_ylim = [y_center + (y - y_center) * scale_factor for y in xlim]
+    ax.set_xlim(new_xlim)
+    #ax.set_ylim(new_ylim)
+    zoom_limits['xlim'] = new_xlim
+    #zoom_limits['ylim'] = new_ylim
+    canvas.draw_idle()
+
+def on_close():
+    if journal is not None:
+        journal.close()
+    root.destroy()
+    sys.exit()
+
+
+# Spawned scan workers import this module, so the GUI only starts when run directly
+if __name__ == "__main__":
+    use_waveform_store(WAVEFORM_STORE_PATH)
+    use_npy_cache(NPY_CACHE_DIR)
+    use_filter_cache(FILTER_CACHE_DIR)
+    prefetcher = Prefetcher(prepare_trace, max_items=PREFETCH_NEXT + PREFETCH_PREV + 2)
+
+    # Initial file prompt
+    root = tk.Tk()
+    root.title('Waveform Labeling')
+    root.geometry("1000x800")
+    root.minsize(1000, 800)
+
+    root.withdraw()
+    top_frame = tk.Frame(root)
+    top_frame.pack(fill='x', pady=10)
+
+    file_label = tk.Label(top_frame, text="", wraplength=900, justify='center', font=("Arial", 12), fg="blue")
+    file_label.pack(anchor='center', pady=(5, 10))
+
+    progress_bar = ttk.Progressbar(top_frame, orient='horizontal', length=600, mode='determinate', maximum=100)
+    progress_bar.pack(anchor='center')
+    progress_label = tk.Label(top_frame, text="", font=("Arial", 10))
+    progress_label.pack(anchor='center', pady=(0, 5))
+
+    path = filedialog.askdirectory(title='Select waveform file or folder')
+    if not path:
+        messagebox.showwarning('No file selected', 'You must select a waveform file or folder.')
+        root.destroy()
+        sys.exit()
+    else:
+        load_waveform_data(path)
+        file_label.config(text=f"Loaded: {file_name}")
+        root.deiconify()
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
+
+    # GUI Layout
+
+
+    instruction_label = tk.Label(
+        top_frame,
+        text=f"Click on the waveform to mark a point of interest.\nUse Next/Previous to navigate. Save to export labels.",
+        justify='center', font=("Arial", 15), anchor='center')
+    instruction_label.pack(anchor='center')
+    fig, ax = plt.subplots()
+    canvas = FigureCanvasTkAgg(fig, master=root)
+    canvas_widget = canvas.get_tk_widget()
+    canvas_widget.pack(fill='both', expand=True)
+    canvas.mpl_connect('button_press_event', on_click)
+    canvas.mpl_connect('motion_notify_event', on_mouse_move)
+    waveform_line, = ax.plot([], [], label='Waveform')
+    pick_line = ax.axvline(0, color='red', linestyle='-', label='Marked Point', visible=False)
+    cursor_line = ax.axvline(0, color='red', linestyle='--', alpha=0.4)
+    blit_manager = BlitManager(canvas, [pick_line, cursor_line], enabled=BLIT_CURSOR)
+    ax.callbacks.connect('xlim_changed', on_xlim_changed)
+
+    controls = tk.Frame(root)
+    controls.pack(fill='x', pady=10)
+
+    prev_btn = tk.Button(controls, text="Previous", command=prev_waveform, width=12, height=2)
+    prev_btn.pack(side=tk.LEFT, padx=5)
+
+    next_btn = tk.Button(controls, text="Next", command=next_waveform, width=12, height=2)
+    next_btn.pack(side=tk.LEFT, padx=5)
+
+    save_btn = tk.Button(controls, text="Save", command=save_labels_csv, width=12, height=2)
+    save_btn.pack(side=tk.LEFT, padx=5)
+
+    file_btn = tk.Button(controls, text="Import File", command=uploadfile, width=12, height=2)
+    file_btn.pack(side=tk.LEFT, padx=5)
+    canvas.mpl_connect('scroll_event', on_scroll)
+
+    goto_btn = tk.Button(controls, text="Go", command=go_to_index, width=6, height=2)
+    goto_btn.pack(side=tk.LEFT, padx=5)
+
+    goto_entry = tk.Entry(controls, width=6)
+    goto_entry.pack(side=tk.LEFT, padx=5)
+    toolbar = NavigationToolbar2Tk(canvas, root)
+    toolbar.update()
+    toolbar.pack(side=tk.TOP, fill=tk.X)
+
+
+    redraw_plot()
+    update_button_states()
+    root.mainloop()
@@ -0,0 +1,89 @@
+import json
+import os
+from pathlib import Path
+import numpy as np
+from obspy import Stream, Trace, UTCDateTime
+
+
+def sidecar_paths(cache_dir, full_path):
+    """
+    Packed samples (.npy) and metadata (.json) paths for an .mseed file, laid
+    out as cache_dir/experiment/run/file_stem so the data folder stays untouched.
+    """
+    p = Path(full_path)
+    base = os.path.join(cache_dir, p.parent.parent.name, p.parent.name, p.stem)
+    return base + '.npy', base + '.json'
+
+
+def _source_signature(full_path):
+    st = os.stat(full_path)
+    return os.path.abspath(full_path), st.st_size, st.st_mtime
+
+
+def load_sidecar(cache_dir, full_path):
+    """
+    Stream whose traces are read-only views into a memory-mapped sidecar, or None
+    when there is no sidecar or the source file's size or mtime has changed.
+    Traces of a stream mixing dtypes were packed upcast and come back as copies
+    in their original dtype.
+    """
+    npy_path, meta_path = sidecar_paths(cache_dir, full_path)
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if (meta['source_path'], meta['source_size'], meta['source_mtime']) != _source_signature(full_path):
+            return None
+        # sidecars written before dtypes were recorded are decoded again
+        dtypes = meta['dtypes']
+        samples = np.load(npy_path, mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+
+    offsets = meta['offsets']
+    traces = []
+    for i, header in enumerate(meta['headers']):
+        header = dict(header, starttime=UTCDateTime(header['starttime']))
+        data = samples[offsets[i]:offsets[i + 1]]
+        if data.dtype != np.dtype(dtypes[i]):
+            data = data.astype(dtypes[i])
+        traces.append(Trace(data=data, header=header))
+    return Stream(traces)
+
+
+def write_sidecar(cache_dir, full_path, st):
+    """
+    Packs every trace of st into one .npy plus a .json of offsets, dtypes and
+    headers. mseed samples (int32, float32, float64) all fit float64 exactly, so
+    a stream mixing them is packed upcast and cast back on load.
+    Files are written under temporary names and renamed, with the .json last,
+    so concurrent readers never see a half written sidecar.
+    """
+    npy_path, meta_path = sidecar_paths(cache_dir, full_path)
+    source_path, source_size, source_mtime = _source_signature(full_path)
+    meta = {
+        'source_path': source_path,
+        'source_size': source_size,
+        'source_mtime': source_mtime,
+        'offsets': np.concatenate([[0], np.cumsum([len(tr.data) for tr in st])]).tolist(),
+        'dtypes': [tr.data.dtype.str for tr in st],
+        'headers': [{
+            'sampling_rate': tr.stats.sampling_rate,
+            'starttime': str(tr.stats.starttime),
+            'network': tr.stats.network,
+            'station': tr.stats.station,
+            'location': tr.stats.location,
+            'channel': tr.stats.channel,
+        } for tr in st],
+    }
+    suffix = f'.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(npy_path), exist_ok=True)
+        with open(npy_path + suffix, 'wb') as f:
+            np.save(f, np.concatenate([tr.data for tr in st]) if len(st) else np.empty(0))
+        with open(meta_path + suffix, 'w') as f:
+            json.dump(meta, f)
+        os.replace(npy_path + suffix, npy_path)
+        os.replace(meta_path + suffix, meta_path)
+    except OSError as e:
+        # the cache is best effort, a failed write only costs a decode next time
+        print(f"Could not write sidecar for {full_path}: {e}")
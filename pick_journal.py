@@ -0,0 +1,68 @@
+import os
+import time
+
+
+class PickJournal:
+    """
+    Append-only log of picks kept next to the picks csv.
+
+    Every click appends one "timestamp,name,sample" line and flushes it, so a
+    crash or closing without saving loses nothing. replay() applies the log onto
+    freshly loaded labels and compact() empties it once the csv has been written.
+    """
+    def __init__(self, journal_path, fsync=False):
+        self.path = journal_path
+        self.fsync = fsync
+        os.makedirs(os.path.dirname(journal_path) or '.', exist_ok=True)
+        self._drop_torn_line()
+        self._file = open(journal_path, 'a', newline='')
+
+    def _drop_torn_line(self):
+        # a crash mid-write leaves a last line without its newline, cut it off
+        # so the next pick does not get glued onto it
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                f.truncate(end)
+
+    def record(self, name, sample):
+        self._file.write(f'{time.time():.3f},{name},{int(sample)}\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def replay(self, names, labels):
+        """
+        Applies journaled picks onto labels in order, later picks win.
+        Returns the number of picks applied.
+        """
+        positions = {name: i for i, name in enumerate(names)}
+        applied = 0
+        with open(self.path, newline='') as f:
+            for line in f:
+                # a line cut short by a crash has no trailing newline
+                if not line.endswith('\n'):
+                    continue
+                parts = line.rstrip('\n').split(',')
+                if len(parts) != 3:
+                    continue
+                _, name, sample = parts
+                i = positions.get(name)
+                if i is None:
+                    continue
+                try:
+                    labels[i] = int(sample)
+                except ValueError:
+                    continue
+                applied += 1
+        return applied
+
+    def compact(self):
+        self._file.truncate(0)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
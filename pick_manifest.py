@@ -0,0 +1,98 @@
+import json
+import os
+from waveform_io import scan_corpus
+
+
+class PickManifest:
+    """
+    Per-file cache of picker results kept next to a picks csv.
+
+    Each source file is stored with its size, mtime and the picks it produced.
+    A file whose size or mtime changed, or every file once the picker params
+    differ from the ones recorded, counts as missing so only those are picked
+    again on the next run.
+    """
+    def __init__(self, manifest_path, params):
+        self.path = manifest_path
+        self.params = params
+        self._files = {}
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get('params') == params:
+                self._files = manifest['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _signature(self, full_path):
+        st = os.stat(full_path)
+        return st.st_size, st.st_mtime
+
+    def cached(self, full_path):
+        """
+        (label names, picks) recorded for full_path, None if missing or stale.
+        A file that can't be stat'ed counts as stale, so reading it reports
+        the error through the normal per-file path.
+        """
+        entry = self._files.get(os.path.abspath(full_path))
+        if entry is None:
+            return None
+        try:
+            if (entry['size'], entry['mtime']) != self._signature(full_path):
+                return None
+        except OSError:
+            return None
+        return entry['names'], entry['picks']
+
+    def update(self, full_path, names, picks):
+        """
+        Records picks for full_path, a list of picks or a list of such lists
+        for pickers writing several csvs in one pass. Nothing is recorded if
+        the file is gone by now, it is picked again next run.
+        """
+        try:
+            size, mtime = self._signature(full_path)
+        except OSError:
+            return
+        self._files[os.path.abspath(full_path)] = {
+            'size': size,
+            'mtime': mtime,
+            'names': list(names),
+            'picks': _int_picks(picks),
+        }
+
+    def save(self, file_paths):
+        """
+        Writes the manifest for file_paths, entries of files no longer in the
+        corpus are dropped. Written under a temporary name and renamed.
+        """
+        keep = {os.path.abspath(p) for p in file_paths}
+        files = {p: entry for p, entry in self._files.items() if p in keep}
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'params': self.params, 'files': files}, f)
+        os.replace(tmp_path, self.path)
+
+
+def _int_picks(picks):
+    return [_int_picks(p) if isinstance(p, (list, tuple)) else int(p) for p in picks]
+
+
+def scan_uncached(file_paths, read_file, manifest=None, workers=None):
+    """
+    scan_corpus over only the files manifest has no current picks for.
+
+    Yields (full_path, result, error, cached) for every file in file_paths in
+    order: cached is the manifest's (label names, picks) and result/error are
+    None for files that were skipped, cached is None for files that were read.
+    """
+    cached = {p: manifest.cached(p) if manifest is not None else None for p in file_paths}
+    stale = [p for p in file_paths if cached[p] is None]
+    if manifest is not None:
+        print(f"{len(file_paths) - len(stale)} files unchanged since the last run, picking {len(stale)}")
+    results = scan_corpus(None, read_file, workers, stale)
+    for full_path in file_paths:
+        if cached[full_path] is not None:
+            yield full_path, None, None, cached[full_path]
+        else:
+            yield next(results) + (None,)
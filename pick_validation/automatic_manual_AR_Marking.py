@@ -1,107 +1,583 @@
-import numpy as np
-import pandas as pd
-import os
-from obspy import read
-from pathlib import Path
-from obspy.signal.trigger import classic_sta_lta, trigger_onset
-import matplotlib.pyplot as plt  # Optional: for visual debugging
-
-# --- Helper Function for Path Components ---
-def get_full_path_components(root_dir, file_name):
-    """
-    Extracts relevant path components and file information.
-    """
-    full_path = os.path.join(root_dir, file_name)
-    p = Path(full_path)
-    file_stem = p.stem
-    run_num = p.parent.name
-    exp_name = p.parent.parent.name
-    parts = file_stem.split('_')
-    event_id = '_'.join(parts[:2])
-    return full_path, exp_name, run_num, event_id, file_stem
-
-
-def sta_lta_picker(path, sta_win=200, lta_win=7500, threshold_on=12, threshold_off=0.3):
-    all_p_labels = []
-    all_label_names = []
-
-    print(f"Starting STA/LTA picking from: {path}")
-
-    for root_dir, _, files in os.walk(path):
-        for file_name in files:
-            full_path, exp_name, run_num, event_id, file_stem = get_full_path_components(root_dir, file_name)
-
-            try:
-                st = read(full_path)
-                st.detrend("demean")  # still remove DC offset
-            except Exception as e:
-                print(f"[ERROR] Failed to read {full_path}: {e}")
-                continue
-
-            for i, tr in enumerate(st):
-                label_name_str = f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}'
-                all_label_names.append(label_name_str)
-                data = tr.data.astype(np.float32)
-
-                try:
-                    print(f"[DEBUG] Trace {label_name_str} length: {len(data)}")
-
-                    if len(data) < lta_win * 2:
-                        print(f"[WARN] Trace {label_name_str} too short ({len(data)} samples), skipping.")
-                        all_p_labels.append(-1)
-                        continue
-
-                    if np.isnan(data).any() or np.isinf(data).any():
-                        print(f"[WARN] Trace {label_name_str} contains NaNs or Infs, skipping.")
-                        all_p_labels.append(-1)
-                        continue
-
-                    # No filter or normalization here
-                    cft = classic_sta_lta(data, int(sta_win), int(lta_win))
-                    max_cft = np.max(cft)
-                    print(f"[DEBUG] Max STA/LTA for {label_name_str}: {max_cft:.2f}")
-
-                    on_off = trigger_onset(cft, threshold_on, threshold_off)
-
-                    if len(on_off) > 0:
-                        first_trigger = on_off[0][0]
-                        print(f"[DEBUG] Trigger at {first_trigger} for {label_name_str}")
-
-                        if first_trigger >= int(lta_win * 0.8):  # allow early picks just past LTA start
-                            all_p_labels.append(first_trigger)
-                            print(f"[OK] Picked at {first_trigger} with threshold {threshold_on:.2f} for {label_name_str}")
-                        else:
-                            print(f"[INFO] Trigger at {first_trigger} too close to LTA start for {label_name_str}")
-                            all_p_labels.append(-1)
-                    else:
-                        print(f"[INFO] No trigger found at threshold {threshold_on:.2f} for {label_name_str}")
-                        all_p_labels.append(-1)
-
-                except Exception as e:
-                    print(f"[ERROR] STA/LTA failed on {label_name_str}: {e}")
-                    all_p_labels.append(-1)
-                    continue
-
-            print(f"Finished processing {file_name}")
-
-    labels_df = pd.DataFrame({
-        'Name': all_label_names,
-        'marked_point': all_p_labels
-    })
-    output_csv_path = 'p_picks_sta_lta.csv'
-    labels_df.to_csv(output_csv_path, index=False)
-    print(f"\nSTA/LTA picking complete. Results saved to {output_csv_path}")
-
-
-
-
-
-
-
-
-if __name__ == "__main__":
-    data_directory = r'F:\Data'
-    print(f"Starting seismic data processing in {data_directory}")
-    sta_lta_picker(data_directory)
-    print("\nAll seismic picking operations completed.")
-
+import numpy as np
+import pandas as pd
+import os
+import sys
+from functools import partial
+from pathlib import Path
+from obspy.signal.trigger import classic_sta_lta, trigger_onset
+import matplotlib.pyplot as plt  # Optional: for visual debugging
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from waveform_io import scan_corpus, read_stream, list_waveform_files, trace_chunk_sources, use_waveform_store, use_npy_cache
+from pick_manifest import PickManifest, scan_uncached
+from waveform_filter import read_filtered, use_filter_cache
+
+# --- Helper Function for Path Components ---
+def get_full_path_components(root_dir, file_name):
+    """
+    Extracts relevant path components and file information.
+    """
+    full_path = os.path.join(root_dir, file_name)
+    p = Path(full_path)
+    file_stem = p.stem
+    run_num = p.parent.name
+    exp_name = p.parent.parent.name
+    parts = file_stem.split('_')
+    event_id = '_'.join(parts[:2])
+    return full_path, exp_name, run_num, event_id, file_stem
+
+
+def read_demeaned(full_path):
+    st = read_stream(full_path)
+    st.detrend("demean")  # still remove DC offset
+    return st
+
+
+# Samples evaluated per step by the first-arrival STA/LTA
+STREAM_CHUNK = 16384
+
+
+def first_sta_lta_trigger(data, nsta, nlta, threshold_on, chunk=STREAM_CHUNK):
+    """
+    Index of the first sample where the classic STA/LTA reaches threshold_on,
+    -1 if it never does, and the largest ratio seen up to there.
+
+    The running sums are evaluated chunk by chunk with the same recurrence and
+    operation order as obspy's classic_sta_lta, so the ratio is bit-identical,
+    but evaluation stops at the first crossing instead of covering the trace.
+    """
+    x = np.asarray(data, dtype=np.float64)
+    return first_sta_lta_trigger_chunks((x[start:start + chunk] for start in range(0, len(x), chunk)),
+                                        nsta, nlta, threshold_on)
+
+
+def first_sta_lta_trigger_chunks(chunks, nsta, nlta, threshold_on):
+    """
+    first_sta_lta_trigger over a trace arriving as consecutive sample chunks.
+    Only the running sums and the last nlta samples are carried between
+    chunks, so memory is set by the chunk size rather than the trace length.
+    """
+    frac = nlta / nsta
+    sta = lta = 0.0
+    max_cft = 0.0
+    history = np.empty(0)
+    start = 0
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if not len(chunk):
+            continue
+        stop = start + len(chunk)
+        # x[j - base] is sample j for the carried history plus this chunk
+        x = np.concatenate((history, chunk))
+        base = start - len(history)
+        sq = chunk ** 2
+        # squares leaving each window, zero while the window is still filling
+        d_sta = sq.copy()
+        d_lta = sq
+        for d, n in ((d_sta, nsta), (d_lta, nlta)):
+            lo = max(start, n)
+            if lo < stop:
+                d[lo - start:] -= x[lo - n - base:stop - n - base] ** 2
+        # seeding cumsum with the carried sum keeps the sequential addition order
+        sta_run = np.cumsum(np.concatenate(([sta], d_sta)))[1:]
+        lta_run = np.cumsum(np.concatenate(([lta], d_lta)))[1:]
+        sta, lta = sta_run[-1], lta_run[-1]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cft = sta_run / lta_run * frac
+        cft[:max(nlta - 1 - start, 0)] = 0.
+        max_cft = np.fmax.reduce(cft, initial=max_cft)
+        hits = np.flatnonzero(cft >= threshold_on)
+        if len(hits):
+            return start + hits[0], max_cft
+        history = x[-nlta:]
+        start = stop
+    return -1, max_cft
+
+
+def pick_trace(data, label_name_str, sta_win, lta_win, threshold_on, threshold_off, log, first_arrival=False):
+    """
+    STA/LTA first arrival of one demeaned trace, -1 when nothing usable triggers.
+    Progress lines are appended to log rather than printed. first_arrival stops
+    evaluating at the first trigger, the pick is the same either way.
+    """
+    log.append(f"[DEBUG] Trace {label_name_str} length: {len(data)}")
+
+    if len(data) < lta_win * 2:
+        log.append(f"[WARN] Trace {label_name_str} too short ({len(data)} samples), skipping.")
+        return -1
+
+    if np.isnan(data).any() or np.isinf(data).any():
+        log.append(f"[WARN] Trace {label_name_str} contains NaNs or Infs, skipping.")
+        return -1
+
+    # No filter or normalization here
+    if first_arrival:
+        # only the first trigger is used, so stop the STA/LTA as soon as it fires
+        first_trigger, max_cft = first_sta_lta_trigger(data, int(sta_win), int(lta_win), threshold_on)
+        log.append(f"[DEBUG] Max STA/LTA up to the trigger for {label_name_str}: {max_cft:.2f}")
+        on_off = [[first_trigger]] if first_trigger >= 0 else []
+    else:
+        cft = classic_sta_lta(data, int(sta_win), int(lta_win))
+        max_cft = np.max(cft)
+        log.append(f"[DEBUG] Max STA/LTA for {label_name_str}: {max_cft:.2f}")
+
+        on_off = trigger_onset(cft, threshold_on, threshold_off)
+
+    return accept_trigger(on_off[0][0] if len(on_off) > 0 else -1, label_name_str, lta_win, threshold_on, log)
+
+
+def accept_trigger(first_trigger, label_name_str, lta_win, threshold_on, log):
+    """
+    Pick for a trace's first trigger (-1 for none), dropping triggers that
+    fire before the LTA window has mostly filled.
+    """
+    if first_trigger >= 0:
+        log.append(f"[DEBUG] Trigger at {first_trigger} for {label_name_str}")
+
+        if first_trigger >= int(lta_win * 0.8):  # allow early picks just past LTA start
+            log.append(f"[OK] Picked at {first_trigger} with threshold {threshold_on:.2f} for {label_name_str}")
+            return first_trigger
+        log.append(f"[INFO] Trigger at {first_trigger} too close to LTA start for {label_name_str}")
+        return -1
+
+    log.append(f"[INFO] No trigger found at threshold {threshold_on:.2f} for {label_name_str}")
+    return -1
+
+
+def pick_trace_chunked(npts, read_chunk, label_name_str, sta_win, lta_win, threshold_on, log, chunk_samples):
+    """
+    pick_trace in first-arrival mode for a trace read chunk_samples at a time
+    through read_chunk(start, stop), nothing longer than a chunk is held.
+
+    The demean is done in two passes. The first sums the samples and the
+    second streams demeaned float32 chunks into the STA/LTA. Integer samples
+    are summed exactly, so the mean and the picks are bit-identical to
+    demeaning the whole trace. Float samples match to rounding.
+    """
+    log.append(f"[DEBUG] Trace {label_name_str} length: {npts}")
+
+    if npts < lta_win * 2:
+        log.append(f"[WARN] Trace {label_name_str} too short ({npts} samples), skipping.")
+        return -1
+
+    total = 0
+    for start in range(0, npts, chunk_samples):
+        chunk = read_chunk(start, start + chunk_samples)
+        if np.issubdtype(chunk.dtype, np.integer):
+            total += int(chunk.sum(dtype=np.int64))
+        else:
+            if not np.isfinite(chunk).all():
+                log.append(f"[WARN] Trace {label_name_str} contains NaNs or Infs, skipping.")
+                return -1
+            total += float(chunk.sum(dtype=np.float64))
+    mean = float(total) / npts
+
+    demeaned = ((read_chunk(start, start + chunk_samples) - mean).astype(np.float32)
+                for start in range(0, npts, chunk_samples))
+    first_trigger, max_cft = first_sta_lta_trigger_chunks(demeaned, int(sta_win), int(lta_win), threshold_on)
+    log.append(f"[DEBUG] Max STA/LTA up to the trigger for {label_name_str}: {max_cft:.2f}")
+    return accept_trigger(first_trigger, label_name_str, lta_win, threshold_on, log)
+
+
+def pick_file(full_path, sta_win, lta_win, threshold_on, threshold_off, first_arrival=False, chunk_samples=None,
+              filter_params=None, aic_window=None):
+    """
+    Reads one file and picks every trace in it, runs inside a worker process.
+    Returns (label names, picks, AIC picks, failures, log lines) for the
+    parent to merge. With chunk_samples set traces are read and picked chunk
+    by chunk. With filter_params the shared filtered copy is picked, windows
+    are in filtered samples and picks are mapped back to the original sample
+    axis. With aic_window=(before, after) each trigger is also refined by
+    aic_refine on the same samples, otherwise the AIC picks list is empty.
+    """
+    root_dir, file_name = os.path.split(full_path)
+    _, exp_name, run_num, event_id, _ = get_full_path_components(root_dir, file_name)
+    step = 1
+    if chunk_samples:
+        traces = trace_chunk_sources(full_path)
+    elif filter_params:
+        traces = read_filtered(full_path, filter_params)
+        step = filter_params.get('decimate', 1)
+    else:
+        traces = read_demeaned(full_path)
+
+    label_names, picks, aic_picks, failures, log = [], [], [], [], []
+    for i, tr in enumerate(traces):
+        label_name_str = f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}'
+        label_names.append(label_name_str)
+        pick = onset = -1
+        try:
+            if chunk_samples:
+                npts, read_chunk = tr
+                pick = pick_trace_chunked(npts, read_chunk, label_name_str, sta_win, lta_win,
+                                          threshold_on, log, chunk_samples)
+                if aic_window and pick >= 0:
+                    # only the samples around the trigger are read again, aic_onset removes their mean
+                    start = max(pick - aic_window[0], 0)
+                    window = read_chunk(start, pick + aic_window[1])
+                    onset = aic_refine(window, pick - start, aic_window)
+                    onset = start + onset if onset >= 0 else -1
+            else:
+                data = tr.data.astype(np.float32)
+                pick = pick_trace(data, label_name_str, sta_win, lta_win, threshold_on, threshold_off, log,
+                                  first_arrival)
+                if aic_window:
+                    onset = aic_refine(data, pick, aic_window)
+        except Exception as e:
+            log.append(f"[ERROR] STA/LTA failed on {label_name_str}: {e}")
+            failures.append((label_name_str, str(e)))
+        picks.append(pick * step if pick >= 0 else -1)
+        if aic_window:
+            aic_picks.append(onset * step if onset >= 0 else -1)
+    return label_names, picks, aic_picks, failures, log
+
+
+def sta_lta_stream_picks(raw_traces, traces, label_names, step=1, sta_win=200, lta_win=7500,
+                         threshold_on=12, threshold_off=0.3, first_arrival=False):
+    """
+    Picker plugin for multi_picker.run_pickers, STA/LTA on the preprocessed traces.
+    """
+    picks = []
+    for data, label_name_str in zip(traces, label_names):
+        try:
+            pick = pick_trace(data.astype(np.float32), label_name_str, sta_win, lta_win,
+                              threshold_on, threshold_off, [], first_arrival)
+            picks.append(pick * step if pick >= 0 else -1)
+        except Exception as e:
+            print(f"[ERROR] STA/LTA failed on {label_name_str}: {e}")
+            picks.append(-1)
+    return picks
+
+
+def sta_lta_picker(path, sta_win=200, lta_win=7500, threshold_on=12, threshold_off=0.3, workers=None,
+                   first_arrival=False, incremental=False, chunk_samples=None, filter_params=None, aic_window=None):
+    """
+    Picks every trace under path and writes p_picks_sta_lta.csv.
+
+    Files are picked in parallel across workers processes (None uses every
+    core, 1 runs serially in this process) and merged back in os.walk order,
+    so the csv is the same whatever the worker count. first_arrival stops each
+    trace's STA/LTA at its first trigger. incremental keeps a manifest next to
+    the csv and only picks files that are new or changed since the last run
+    with the same parameters. chunk_samples caps picking memory per trace at
+    about that many samples, see pick_trace_chunked. filter_params picks on
+    the bandpassed traces from waveform_filter instead of the demeaned ones.
+    aic_window=(before, after) also refines every trigger with the AIC
+    onset in the same pass and writes p_picks_aic.csv, the same picks
+    aic_picker gives without decoding every file a second time.
+    Returns the list of (file or trace name, error) failures.
+    """
+    if chunk_samples and filter_params:
+        raise ValueError("chunk_samples and filter_params can't be combined, filtering needs whole traces")
+    all_p_labels = []
+    all_aic_labels = []
+    all_label_names = []
+    failures = []
+    output_csv_path = 'p_picks_sta_lta.csv'
+    aic_csv_path = 'p_picks_aic.csv'
+
+    print(f"Starting STA/LTA picking from: {path}")
+
+    file_paths = list_waveform_files(path)
+    manifest = None
+    if incremental:
+        params = {'sta_win': sta_win, 'lta_win': lta_win, 'threshold_on': threshold_on, 'threshold_off': threshold_off,
+                  'filter': filter_params}
+        if aic_window:
+            # the manifest then holds [sta/lta picks, aic picks] per file
+            params['aic_window'] = list(aic_window)
+        manifest = PickManifest(output_csv_path + '.manifest.json', params)
+
+    pick = partial(pick_file, sta_win=sta_win, lta_win=lta_win,
+                   threshold_on=threshold_on, threshold_off=threshold_off, first_arrival=first_arrival,
+                   chunk_samples=chunk_samples, filter_params=filter_params, aic_window=aic_window)
+    for full_path, result, error, cached in scan_uncached(file_paths, pick, manifest, workers):
+        if cached is not None:
+            all_label_names.extend(cached[0])
+            if aic_window:
+                all_p_labels.extend(cached[1][0])
+                all_aic_labels.extend(cached[1][1])
+            else:
+                all_p_labels.extend(cached[1])
+            continue
+        if error is not None:
+            print(f"[ERROR] Failed to read {full_path}: {error}")
+            failures.append((full_path, error))
+            continue
+
+        label_names, picks, aic_picks, file_failures, log = result
+        for line in log:
+            print(line)
+        all_label_names.extend(label_names)
+        all_p_labels.extend(picks)
+        all_aic_labels.extend(aic_picks)
+        failures.extend(file_failures)
+        if manifest is not None and not file_failures:
+            manifest.update(full_path, label_names, [picks, aic_picks] if aic_window else picks)
+
+        print(f"Finished processing {os.path.basename(full_path)}")
+
+    labels_df = pd.DataFrame({
+        'Name': all_label_names,
+        'marked_point': all_p_labels
+    })
+    labels_df.to_csv(output_csv_path, index=False)
+    if aic_window:
+        pd.DataFrame({'Name': all_label_names, 'marked_point': all_aic_labels}).to_csv(aic_csv_path, index=False)
+    if manifest is not None:
+        manifest.save(file_paths)
+    print(f"\nSTA/LTA picking complete. Results saved to {output_csv_path}")
+    if aic_window:
+        print(f"AIC picks saved to {aic_csv_path}")
+    if failures:
+        print(f"{len(failures)} failures:")
+        for name, error in failures:
+            print(f"  {name}: {error}")
+    return failures
+
+
+# --- AIC Onset Picker ---
+def aic_onset(data):
+    """
+    Sample where the AIC of splitting data into two stationary segments is
+    lowest (Maeda 1985), -1 for fewer than 5 samples.
+
+    AIC(k) = k log(var(x[:k])) + (N - k - 1) log(var(x[k:])), with both
+    variances for every k taken from cumulative sums so the cost is O(N).
+    """
+    x = np.asarray(data, dtype=np.float64)
+    n = len(x)
+    if n < 5:
+        return -1
+    x = x - x.mean()
+    c1 = np.cumsum(x)
+    c2 = np.cumsum(x * x)
+
+    # split before sample k, each side keeps at least 2 samples
+    k = np.arange(2, n - 1)
+    left_var = c2[k - 1] / k - (c1[k - 1] / k) ** 2
+    right_n = n - k
+    right_var = (c2[-1] - c2[k - 1]) / right_n - ((c1[-1] - c1[k - 1]) / right_n) ** 2
+    tiny = np.finfo(0.0).tiny
+    aic = k * np.log(np.maximum(left_var, tiny)) + (right_n - 1) * np.log(np.maximum(right_var, tiny))
+    return int(k[np.argmin(aic)])
+
+
+def aic_refine(data, trigger, aic_window):
+    """
+    AIC onset within aic_window=(before, after) samples around trigger in
+    data, -1 when there is no trigger or too few samples.
+    """
+    if trigger < 0:
+        return -1
+    start = max(trigger - aic_window[0], 0)
+    onset = aic_onset(data[start:trigger + aic_window[1]])
+    return start + onset if onset >= 0 else -1
+
+
+def aic_stream_picks(raw_traces, traces, label_names, step=1, sta_win=200, lta_win=7500, threshold_on=12,
+                     aic_window=(2000, 2000)):
+    """
+    Picker plugin for multi_picker.run_pickers, AIC onsets on the preprocessed traces.
+
+    With aic_window=(before, after) the AIC only runs over that many samples
+    around the first-arrival STA/LTA trigger and traces without a trigger get
+    -1. aic_window=None runs it over the whole trace.
+    """
+    picks = []
+    for data, label_name_str in zip(traces, label_names):
+        data = data.astype(np.float32)
+        try:
+            if aic_window is None:
+                onset = aic_onset(data)
+                picks.append(onset * step if onset >= 0 else -1)
+                continue
+            trigger = pick_trace(data, label_name_str, sta_win, lta_win, threshold_on, 0, [], first_arrival=True)
+            onset = aic_refine(data, trigger, aic_window)
+            picks.append(onset * step if onset >= 0 else -1)
+        except Exception as e:
+            print(f"[ERROR] AIC failed on {label_name_str}: {e}")
+            picks.append(-1)
+    return picks
+
+
+def aic_file(full_path, **params):
+    root_dir, file_name = os.path.split(full_path)
+    _, exp_name, run_num, event_id, _ = get_full_path_components(root_dir, file_name)
+    st = read_demeaned(full_path)
+    label_names = [f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}' for i in range(len(st))]
+    return label_names, aic_stream_picks(None, [tr.data for tr in st], label_names, **params)
+
+
+def aic_picker(path, sta_win=200, lta_win=7500, threshold_on=12, aic_window=(2000, 2000), workers=None):
+    """
+    AIC onset of every trace under path, written to p_picks_aic.csv.
+    See aic_stream_picks for aic_window.
+    """
+    all_p_labels = []
+    all_label_names = []
+
+    print(f"Starting AIC picking from: {path}")
+    pick = partial(aic_file, sta_win=sta_win, lta_win=lta_win, threshold_on=threshold_on, aic_window=aic_window)
+    for full_path, result, error in scan_corpus(path, pick, workers):
+        if error is not None:
+            print(f"[ERROR] Failed to read {full_path}: {error}")
+            continue
+        label_names, picks = result
+        all_label_names.extend(label_names)
+        all_p_labels.extend(picks)
+        print(f"Finished processing {os.path.basename(full_path)}")
+
+    labels_df = pd.DataFrame({'Name': all_label_names, 'marked_point': all_p_labels})
+    output_csv_path = 'p_picks_aic.csv'
+    labels_df.to_csv(output_csv_path, index=False)
+    print(f"\nAIC picking complete. Results saved to {output_csv_path}")
+
+
+# --- Parameter Sweep ---
+def sweep_file(full_path, window_pairs, thresholds_on):
+    """
+    First STA/LTA trigger of every trace in one file for every window pair and
+    threshold, from a single prefix sum of squared samples per trace.
+    Returns (label names, picks) with picks shaped
+    (traces, window pairs, thresholds), -1 where nothing usable triggers.
+    """
+    root_dir, file_name = os.path.split(full_path)
+    _, exp_name, run_num, event_id, _ = get_full_path_components(root_dir, file_name)
+    st = read_demeaned(full_path)
+    thresholds_on = np.asarray(thresholds_on, dtype=np.float64)
+
+    label_names = []
+    picks = np.full((len(st), len(window_pairs), len(thresholds_on)), -1, dtype=np.int64)
+    for i, tr in enumerate(st):
+        label_names.append(f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}')
+        data = tr.data.astype(np.float32).astype(np.float64)
+        if np.isnan(data).any() or np.isinf(data).any():
+            continue
+        csum = np.concatenate(([0.], np.cumsum(data ** 2)))
+
+        for k, (sta_win, lta_win) in enumerate(window_pairs):
+            nsta, nlta = int(sta_win), int(lta_win)
+            if len(data) < lta_win * 2:
+                continue
+            # window sums ending at each sample, same layout as classic_sta_lta
+            sta = np.empty(len(data))
+            sta[:nsta] = csum[1:nsta + 1]
+            sta[nsta:] = csum[nsta + 1:] - csum[1:-nsta]
+            lta = np.empty(len(data))
+            lta[:nlta] = csum[1:nlta + 1]
+            lta[nlta:] = csum[nlta + 1:] - csum[1:-nlta]
+            lta[lta < np.finfo(0.0).tiny] = np.finfo(0.0).tiny
+            cft = sta / lta * (nlta / nsta)
+            cft[:nlta - 1] = 0.
+
+            # the running maximum turns "first sample above each threshold"
+            # into one searchsorted for the whole threshold list
+            first = np.searchsorted(np.maximum.accumulate(cft), thresholds_on, side='left')
+            usable = (first < len(cft)) & (first >= int(lta_win * 0.8))
+            picks[i, k] = np.where(usable, first, -1)
+    return label_names, picks
+
+
+def sta_lta_sweep(path, sta_wins, lta_wins, thresholds_on, reference_csv='p_picks_Data.csv',
+                  tolerance=100, workers=None, output_csv_path='sta_lta_sweep.csv'):
+    """
+    Scores every (sta_win, lta_win, threshold_on) combination against hand
+    picks in one pass over the data. threshold_off is not swept, the picker
+    only keeps the first trigger onset and that does not depend on it.
+
+    A hit is a trace whose hand pick and STA/LTA pick are both set and at
+    most tolerance samples apart, hit_rate is hits over hand-picked traces.
+    Residual statistics cover every trace where both picks are set. Results
+    are written to output_csv_path best first and returned as a DataFrame.
+    """
+    window_pairs = [(sta_win, lta_win) for sta_win in sta_wins for lta_win in lta_wins if sta_win < lta_win]
+    thresholds_on = list(thresholds_on)
+    print(f"Sweeping {len(window_pairs)} window pairs x {len(thresholds_on)} thresholds over {path}")
+
+    all_label_names = []
+    all_picks = []
+    sweep = partial(sweep_file, window_pairs=window_pairs, thresholds_on=thresholds_on)
+    for full_path, result, error in scan_corpus(path, sweep, workers):
+        if error is not None:
+            print(f"[ERROR] Failed to read {full_path}: {error}")
+            continue
+        label_names, picks = result
+        all_label_names.extend(label_names)
+        all_picks.append(picks)
+        print(f"Swept {os.path.basename(full_path)}")
+
+    picks = np.concatenate(all_picks) if all_picks else np.full((0, len(window_pairs), len(thresholds_on)), -1)
+    hand = pd.read_csv(reference_csv).drop_duplicates('Name', keep='last').set_index('Name')['marked_point']
+    hand = hand.reindex(all_label_names).fillna(-1).to_numpy(dtype=np.int64)
+    n_hand = max(int((hand != -1).sum()), 1)
+
+    rows = []
+    for k, (sta_win, lta_win) in enumerate(window_pairs):
+        for t, threshold_on in enumerate(thresholds_on):
+            auto = picks[:, k, t]
+            both = (hand != -1) & (auto != -1)
+            residual = (auto[both] - hand[both]).astype(np.float64)
+            hits = int((np.abs(residual) <= tolerance).sum())
+            rows.append({
+                'sta_win': sta_win, 'lta_win': lta_win, 'threshold_on': threshold_on,
+                'picked': int((auto != -1).sum()), 'hits': hits, 'hit_rate': hits / n_hand,
+                'mean_residual': residual.mean() if len(residual) else np.nan,
+                'median_residual': np.median(residual) if len(residual) else np.nan,
+                'std_residual': residual.std() if len(residual) else np.nan,
+                'mae': np.abs(residual).mean() if len(residual) else np.nan,
+            })
+    results = pd.DataFrame(rows).sort_values(['hit_rate', 'mae'], ascending=[False, True])
+    results.to_csv(output_csv_path, index=False)
+    print(f"\nSweep complete over {len(all_label_names)} traces. Results saved to {output_csv_path}")
+    print(results.head(10).to_string(index=False))
+    return results
+
+
+
+
+
+
+
+
+if __name__ == "__main__":
+    data_directory = r'F:\Data'
+    # Processes used for picking, None uses every core, 1 runs serially
+    picking_workers = None
+    # Stop each trace's STA/LTA at its first trigger, same picks, less work
+    use_first_arrival = True
+    # Only pick files added or changed since the last run, unchanged ones come from the manifest
+    use_incremental = True
+    # Samples per read for long continuous records, None reads whole traces
+    picking_chunk_samples = None
+    # Bandpass before picking, e.g. {'freqmin': 20e3, 'freqmax': 200e3}, None picks on demeaned data
+    picking_filter = None
+    # AIC refinement of each STA/LTA trigger, (before, after) samples around it, written to
+    # p_picks_aic.csv in the same pass. None skips it, aic_picker covers the whole-trace AIC
+    aic_search_window = (2000, 2000)
+    # HDF5 store built by `python waveform_store.py <data> <store.h5>`, samples are read out of it
+    # instead of decoding .mseed. None reads the .mseed files
+    waveform_store_path = None
+    # Folder for memory-mapped .npy copies of decoded files so later reads skip mseed parsing, None disables them
+    npy_cache_dir = None
+    # Folder for filtered .npy copies shared by the pickers and the GUI, None filters on every run
+    filter_cache_dir = None
+    use_waveform_store(waveform_store_path)
+    use_npy_cache(npy_cache_dir)
+    use_filter_cache(filter_cache_dir)
+    print(f"Starting seismic data processing in {data_directory}")
+    sta_lta_picker(data_directory, workers=picking_workers, first_arrival=use_first_arrival,
+                   incremental=use_incremental, chunk_samples=picking_chunk_samples, filter_params=picking_filter,
+                   aic_window=aic_search_window)
+
+    # Set run_sweep to True to score a grid of parameters against p_picks_Data.csv
+    run_sweep = False
+    if run_sweep:
+        sta_lta_sweep(data_directory,
+                      sta_wins=[50, 100, 200, 400],
+                      lta_wins=[2500, 5000, 7500, 10000],
+                      thresholds_on=[4, 6, 8, 10, 12, 15, 20],
+                      workers=picking_workers)
+    print("\nAll seismic picking operations completed.")
+
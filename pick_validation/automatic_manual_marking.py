@@ -1,100 +1,228 @@
-import numpy as np
-import pandas as pd
-import os
-from obspy import read
-from pathlib import Path
-from scipy.signal import lfilter
-import matplotlib.pyplot as plt # Import matplotlib for plotting
-
-# --- Helper Function for Path Components ---
-def get_full_path_components(root_dir, file_name):
-    """
-    Extracts relevant path components and file information.
-    """
-    full_path = os.path.join(root_dir, file_name)
-    p = Path(full_path)
-    file_stem = p.stem
-    run_num = p.parent.name
-    exp_name = p.parent.parent.name
-    parts = file_stem.split('_')
-    event_id = '_'.join(parts[:2])
-    return full_path, exp_name, run_num, event_id, file_stem
-
-# --- Noise Marker Function ---
-def noise_marker(path, n_initial_samples):
-    """
-    Marks points based on deviation from initial noise range.
-    
-    Parameters:
-        path (str): Root directory to search for seismic files.
-        n_initial_samples (int): Number of initial samples to define the noise range.
-    """
-    all_labels = []
-    all_label_names = []
-    
-    print(f"Starting Noise Marking from: {path}")
-    
-    for root_dir, _, files in os.walk(path):
-        for file_name in files:
-            full_path, exp_name, run_num, event_id, _ = get_full_path_components(root_dir, file_name)
-            
-            try:
-                st = read(full_path)
-            except Exception as e:
-                print(f"Skipping file {full_path} due to read error: {e}")
-                continue
-
-            for i, tr in enumerate(st):
-                trace_data = tr.data.flatten()
-                
-                label_name_str = f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}'
-                all_label_names.append(label_name_str)
-
-                if len(trace_data) < n_initial_samples:
-                    print(f"Warning: Trace length ({len(trace_data)}) < n_initial_samples ({n_initial_samples}) for {label_name_str}. No noise marker set.")
-                    all_labels.append(-1)
-                    continue
-
-                initial_segment = trace_data[:n_initial_samples]
-                range_min = initial_segment.min()
-                range_max = initial_segment.max()
-
-                deviation_indices = np.where((trace_data > range_max) | (trace_data < range_min))[0]
-                
-                if len(deviation_indices) > 0:
-                    idx = deviation_indices[0]
-                    all_labels.append(idx)
-                else:
-                    all_labels.append(-1)
-
-            print(f'Noise Marking in progress for {file_name}...')
-            
-    labels_df = pd.DataFrame({'Name': all_label_names, 'marked_point': all_labels})
-    output_csv_path = 'p_picks_manual_noise.csv'
-    labels_df.to_csv(output_csv_path, index=False)
-    print(f"Noise marking complete. Results saved to {output_csv_path}")
-
-# --- Execution Block ---
-if __name__ == "__main__":
-    # Ensure you have 'nolds', 'obspy', 'pandas', and 'matplotlib' installed:
-    # pip install nolds obspy pandas matplotlib
-
-    # Define the data path
-    data_directory = r'F:\Data'
-
-    # Noise marker parameters
-    initial_noise_window_size = 100000 
-    
-    print(f"Starting seismic data processing in {data_directory}")
-
-    # Run the noise marker
-    noise_marker(data_directory, initial_noise_window_size)
-
-    # --- AR Marker Parameters ---
-    # Set debug_first_n_plots to a number (e.g., 5) to see plots for the first few traces.
-    # Set to 0 to disable all plots during batch processing.
-    debug_plots_count = 5 
-    
-    # Run the AR-based marker
-
+import numpy as np
+import pandas as pd
+import os
+import sys
+from functools import partial
+from pathlib import Path
+from scipy.signal import lfilter
+import matplotlib.pyplot as plt # Import matplotlib for plotting
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from waveform_io import read_stream, list_waveform_files, trace_chunk_sources, use_waveform_store, use_npy_cache
+from pick_manifest import PickManifest, scan_uncached
+from waveform_filter import read_filtered, use_filter_cache
+
+# --- Helper Function for Path Components ---
+def get_full_path_components(root_dir, file_name):
+    """
+    Extracts relevant path components and file information.
+    """
+    full_path = os.path.join(root_dir, file_name)
+    p = Path(full_path)
+    file_stem = p.stem
+    run_num = p.parent.name
+    exp_name = p.parent.parent.name
+    parts = file_stem.split('_')
+    event_id = '_'.join(parts[:2])
+    return full_path, exp_name, run_num, event_id, file_stem
+
+# --- Batched Noise Exceedance ---
+def first_noise_exceedances(traces, n_initial_samples):
+    """
+    First sample of each trace outside the min/max range of its first
+    n_initial_samples, -1 if it never leaves the range or the trace is shorter.
+
+    Traces of equal length are stacked into one 2D array and handled with a
+    single mask and argmax per row, no index list of deviating samples is built.
+    """
+    picks = np.full(len(traces), -1, dtype=np.int64)
+    by_length = {}
+    for i, data in enumerate(traces):
+        if len(data) >= n_initial_samples:
+            by_length.setdefault(len(data), []).append(i)
+
+    for rows in by_length.values():
+        stacked = np.stack([traces[i] for i in rows])
+        initial_segment = stacked[:, :n_initial_samples]
+        range_min = initial_segment.min(axis=1, keepdims=True)
+        range_max = initial_segment.max(axis=1, keepdims=True)
+
+        outside = (stacked > range_max) | (stacked < range_min)
+        first = outside.argmax(axis=1)
+        # argmax gives 0 for a row with no exceedance, tell it apart from a hit at 0
+        found = outside[np.arange(len(rows)), first]
+        picks[rows] = np.where(found, first, -1)
+    return picks.tolist()
+
+def first_noise_exceedance_chunked(npts, read_chunk, n_initial_samples, chunk_samples):
+    """
+    first_noise_exceedances for one trace read chunk_samples at a time through
+    read_chunk(start, stop). The noise min/max is carried across the chunks of
+    the initial window and the search stops at the first exceedance.
+    """
+    if npts < n_initial_samples:
+        return -1
+    range_min = range_max = None
+    for start in range(0, n_initial_samples, chunk_samples):
+        chunk = read_chunk(start, min(start + chunk_samples, n_initial_samples))
+        chunk_min, chunk_max = chunk.min(), chunk.max()
+        range_min = chunk_min if range_min is None else min(range_min, chunk_min)
+        range_max = chunk_max if range_max is None else max(range_max, chunk_max)
+
+    # samples inside the initial window can't leave their own range
+    for start in range(n_initial_samples, npts, chunk_samples):
+        outside = read_chunk(start, start + chunk_samples)
+        outside = (outside > range_max) | (outside < range_min)
+        first = outside.argmax()
+        if outside[first]:
+            return start + int(first)
+    return -1
+
+
+def noise_file_chunked(full_path, n_initial_samples, chunk_samples):
+    """
+    Chunked noise picks of every trace in one file, runs inside a worker
+    process. Returns (trace lengths, picks).
+    """
+    traces = trace_chunk_sources(full_path)
+    return ([npts for npts, _ in traces],
+            [first_noise_exceedance_chunked(npts, read_chunk, n_initial_samples, chunk_samples)
+             for npts, read_chunk in traces])
+
+
+def noise_stream_picks(raw_traces, traces, label_names, step=1, n_initial_samples=100000):
+    """
+    Picker plugin for multi_picker.run_pickers, noise deviation on the preprocessed
+    traces. As in noise_marker with filter_params, n_initial_samples counts
+    preprocessed samples.
+    """
+    picks = first_noise_exceedances([data.flatten() for data in traces], n_initial_samples)
+    return [pick * step if pick >= 0 else -1 for pick in picks]
+
+# --- Noise Marker Function ---
+def noise_marker(path, n_initial_samples, workers=None, incremental=False, chunk_samples=None, filter_params=None):
+    """
+    Marks points based on deviation from initial noise range.
+    
+    Parameters:
+        path (str): Root directory to search for seismic files.
+        n_initial_samples (int): Number of initial samples to define the noise range.
+        workers (int): Processes used to read files, None uses every core
+            and 1 reads in this process.
+        incremental (bool): Only mark files new or changed since the last run,
+            reusing the rest from a manifest kept next to the csv.
+        chunk_samples (int): Read traces this many samples at a time so memory
+            does not grow with record length, None reads whole traces.
+        filter_params (dict): Mark the bandpassed traces from waveform_filter,
+            n_initial_samples counts filtered samples and picks are mapped
+            back to the original sample axis.
+    """
+    if chunk_samples and filter_params:
+        raise ValueError("chunk_samples and filter_params can't be combined, filtering needs whole traces")
+    all_labels = []
+    all_label_names = []
+    output_csv_path = 'p_picks_manual_noise.csv'
+    
+    print(f"Starting Noise Marking from: {path}")
+
+    file_paths = list_waveform_files(path)
+    manifest = None
+    if incremental:
+        manifest = PickManifest(output_csv_path + '.manifest.json',
+                                {'n_initial_samples': n_initial_samples, 'filter': filter_params})
+    
+    if chunk_samples:
+        read_file = partial(noise_file_chunked, n_initial_samples=n_initial_samples, chunk_samples=chunk_samples)
+    elif filter_params:
+        read_file = partial(read_filtered, filter_params=filter_params)
+    else:
+        read_file = read_stream
+    for scanned_path, result, error, cached in scan_uncached(file_paths, read_file, manifest, workers):
+        if cached is not None:
+            all_label_names.extend(cached[0])
+            all_labels.extend(cached[1])
+            continue
+
+        root_dir, file_name = os.path.split(scanned_path)
+        full_path, exp_name, run_num, event_id, _ = get_full_path_components(root_dir, file_name)
+        
+        if error is not None:
+            print(f"Skipping file {full_path} due to read error: {error}")
+            continue
+
+        if chunk_samples:
+            trace_lengths, picks = result
+        else:
+            trace_lengths = [tr.stats.npts for tr in result]
+            picks = first_noise_exceedances([tr.data.flatten() for tr in result], n_initial_samples)
+            if filter_params:
+                step = filter_params.get('decimate', 1)
+                picks = [pick * step if pick >= 0 else -1 for pick in picks]
+
+        label_names = []
+        for i, npts in enumerate(trace_lengths):
+            label_name_str = f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}'
+            label_names.append(label_name_str)
+            if npts < n_initial_samples:
+                print(f"Warning: Trace length ({npts}) < n_initial_samples ({n_initial_samples}) for {label_name_str}. No noise marker set.")
+
+        all_label_names.extend(label_names)
+        all_labels.extend(picks)
+        if manifest is not None:
+            manifest.update(full_path, label_names, picks)
+
+        print(f'Noise Marking in progress for {file_name}...')
+            
+    labels_df = pd.DataFrame({'Name': all_label_names, 'marked_point': all_labels})
+    labels_df.to_csv(output_csv_path, index=False)
+    if manifest is not None:
+        manifest.save(file_paths)
+    print(f"Noise marking complete. Results saved to {output_csv_path}")
+
+# --- Execution Block ---
+if __name__ == "__main__":
+    # Ensure you have 'nolds', 'obspy', 'pandas', and 'matplotlib' installed:
+    # pip install nolds obspy pandas matplotlib
+
+    # Define the data path
+    data_directory = r'F:\Data'
+
+    # Noise marker parameters
+    initial_noise_window_size = 100000 
+    
+    print(f"Starting seismic data processing in {data_directory}")
+
+    # Processes used for marking, None uses every core, 1 runs serially
+    marking_workers = None
+
+    # Only mark files added or changed since the last run
+    use_incremental = True
+
+    # Samples per read for long continuous records, None reads whole traces
+    noise_chunk_samples = None
+    # Bandpass before marking, e.g. {'freqmin': 20e3, 'freqmax': 200e3}, None marks the raw samples
+    noise_filter = None
+
+    # HDF5 store built by `python waveform_store.py <data> <store.h5>`, samples are read out of it
+    # instead of decoding .mseed. None reads the .mseed files
+    waveform_store_path = None
+    # Folder for memory-mapped .npy copies of decoded files so later reads skip mseed parsing, None disables them
+    npy_cache_dir = None
+    # Folder for filtered .npy copies shared by the pickers and the GUI, None filters on every run
+    filter_cache_dir = None
+    use_waveform_store(waveform_store_path)
+    use_npy_cache(npy_cache_dir)
+    use_filter_cache(filter_cache_dir)
+
+    # Run the noise marker
+    noise_marker(data_directory, initial_noise_window_size, workers=marking_workers, incremental=use_incremental,
+                 chunk_samples=noise_chunk_samples, filter_params=noise_filter)
+
+    # --- AR Marker Parameters ---
+    # Set debug_first_n_plots to a number (e.g., 5) to see plots for the first few traces.
+    # Set to 0 to disable all plots during batch processing.
+    debug_plots_count = 5 
+    
+    # Run the AR-based marker
+
     print("\nAll seismic picking operations completed.")
\ No newline at end of file
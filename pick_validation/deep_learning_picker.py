@@ -0,0 +1,204 @@
+import os
+import sys
+import time
+from collections import deque
+from functools import partial
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from scipy.signal import decimate as decimate_samples
+import torch
+import seisbench.models as sbm
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from waveform_io import scan_corpus, read_stream, use_waveform_store, use_npy_cache
+from automatic_manual_AR_Marking import get_full_path_components
+
+
+# --- Model ---
+def load_model(model_name='PhaseNet', weights='original'):
+    """
+    Pretrained SeisBench model in eval mode. weights is a pretrained weight
+    name, or the path given to model.save() for machines without internet.
+    """
+    model_class = getattr(sbm, model_name)
+    if os.path.exists(weights + '.json'):
+        model = model_class.load(weights)
+    else:
+        model = model_class.from_pretrained(weights)
+    model.eval()
+    return model
+
+
+def p_probability(model, batch):
+    """
+    P phase probability for a (windows, channels, samples) batch.
+    """
+    out = model(batch)
+    if isinstance(out, tuple):
+        # EQTransformer returns (detection, P, S)
+        return out[1]
+    return out[:, model.labels.index('P')]
+
+
+# --- Window Producer ---
+def prepare_file(full_path, in_samples, stride, decimate=1, norm='std'):
+    """
+    Reads one file and cuts every trace into normalised model windows, runs
+    inside a worker process so decoding overlaps inference.
+
+    The traces are fed to the model sample for sample (after decimating by
+    decimate), our sampling rate is not resampled to the model's 100 Hz.
+    Returns (label names, per-trace (n_samples, window starts), windows)
+    with windows a single channel (n_windows, in_samples) float32 array.
+    """
+    root_dir, file_name = os.path.split(full_path)
+    _, exp_name, run_num, event_id, _ = get_full_path_components(root_dir, file_name)
+    st = read_stream(full_path)
+
+    label_names, layout, windows = [], [], []
+    for i, tr in enumerate(st):
+        label_names.append(f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}')
+        data = tr.data.astype(np.float64)
+        if decimate > 1:
+            data = decimate_samples(data, decimate, zero_phase=True)
+        n = len(data)
+        if n < in_samples:
+            data = np.concatenate([data, np.zeros(in_samples - n)])
+        starts = list(range(0, len(data) - in_samples + 1, stride))
+        if starts[-1] != len(data) - in_samples:
+            starts.append(len(data) - in_samples)
+        w = np.lib.stride_tricks.sliding_window_view(data, in_samples)[starts]
+        w = w - w.mean(axis=1, keepdims=True)
+        scale = w.std(axis=1, keepdims=True) if norm == 'std' else np.abs(w).max(axis=1, keepdims=True)
+        windows.append((w / (scale + 1e-10)).astype(np.float32))
+        layout.append((n, np.asarray(starts)))
+    windows = np.concatenate(windows) if windows else np.empty((0, in_samples), dtype=np.float32)
+    return label_names, layout, windows
+
+
+def stitch_picks(layout, probs, in_samples, decimate, threshold):
+    """
+    Maximum P probability over overlapping windows per trace, picked at its
+    peak on the original sample axis, -1 when the peak stays below threshold.
+    """
+    picks = []
+    k = 0
+    for n, starts in layout:
+        p = np.zeros(max(n, in_samples), dtype=np.float32)
+        for start in starts:
+            np.maximum(p[start:start + in_samples], probs[k], out=p[start:start + in_samples])
+            k += 1
+        p = p[:n]
+        peak = int(np.argmax(p)) if n else 0
+        picks.append(peak * decimate if n and p[peak] >= threshold else -1)
+    return picks
+
+
+# --- Deep Learning Picker ---
+def deep_learning_picker(path, model_name='PhaseNet', weights='original', threshold=0.3,
+                         batch_size=256, torch_threads=None, decode_workers=2, decimate=1, overlap=0.5):
+    """
+    Picks every trace under path with a pretrained SeisBench model on CPU and
+    writes p_picks_{model_name}.csv.
+
+    Files are decoded and windowed by decode_workers processes a few files
+    ahead while the main process runs the model on batch_size windows at a
+    time across file boundaries. Single component traces are copied onto
+    every model channel. torch_threads caps the intra-op threads, None
+    leaves torch's default. Returns the DataFrame of picks.
+    """
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    model = load_model(model_name, weights)
+    in_samples = model.in_samples
+    stride = max(int(in_samples * (1 - overlap)), 1)
+    norm = getattr(model, 'norm', 'std')
+    print(f"Starting {model_name} picking from: {path} "
+          f"({torch.get_num_threads()} torch threads, batch {batch_size}, {in_samples} sample windows)")
+
+    all_label_names = []
+    all_p_labels = []
+    pending_windows = []
+    n_pending = 0
+    files = deque()
+    probs = []
+    n_probs = 0
+    infer_time = 0.0
+    n_windows = 0
+    t_start = time.perf_counter()
+
+    def run_batches(flush):
+        nonlocal pending_windows, n_pending, n_probs, infer_time, n_windows
+        if not n_pending:
+            return
+        stacked = np.concatenate(pending_windows)
+        end = len(stacked) if flush else len(stacked) - len(stacked) % batch_size
+        t0 = time.perf_counter()
+        with torch.no_grad():
+            for k in range(0, end, batch_size):
+                batch = torch.from_numpy(stacked[k:k + batch_size])
+                batch = batch.unsqueeze(1).expand(-1, model.in_channels, -1)
+                probs.append(p_probability(model, batch).numpy())
+        infer_time += time.perf_counter() - t0
+        n_probs += end
+        n_windows += end
+        pending_windows = [stacked[end:]]
+        n_pending = len(stacked) - end
+
+    def finish_files():
+        nonlocal probs, n_probs
+        while files and n_probs >= files[0][2]:
+            label_names, layout, n_file_windows = files.popleft()
+            done = np.concatenate(probs)
+            all_label_names.extend(label_names)
+            all_p_labels.extend(stitch_picks(layout, done[:n_file_windows], in_samples, decimate, threshold))
+            probs = [done[n_file_windows:]]
+            n_probs -= n_file_windows
+
+    prepare = partial(prepare_file, in_samples=in_samples, stride=stride, decimate=decimate, norm=norm)
+    for full_path, result, error in scan_corpus(path, prepare, decode_workers):
+        if error is not None:
+            print(f"[ERROR] Failed to read {full_path}: {error}")
+            continue
+        label_names, layout, windows = result
+        files.append((label_names, layout, len(windows)))
+        pending_windows.append(windows)
+        n_pending += len(windows)
+        if n_pending >= batch_size:
+            run_batches(flush=False)
+            finish_files()
+        print(f"Queued {os.path.basename(full_path)}")
+    run_batches(flush=True)
+    finish_files()
+
+    elapsed = time.perf_counter() - t_start
+    labels_df = pd.DataFrame({'Name': all_label_names, 'marked_point': all_p_labels})
+    output_csv_path = f'p_picks_{model_name.lower()}.csv'
+    labels_df.to_csv(output_csv_path, index=False)
+    print(f"\n{model_name} picking complete. Results saved to {output_csv_path}")
+    print(f"Throughput: {len(all_label_names)} traces in {elapsed:.1f} s, "
+          f"{len(all_label_names) / max(elapsed, 1e-9):.1f} traces/s, "
+          f"{n_windows / max(infer_time, 1e-9):.1f} windows/s in inference "
+          f"({infer_time:.1f} s inference, {elapsed - infer_time:.1f} s decoding and stitching outside it)")
+    return labels_df
+
+
+if __name__ == "__main__":
+    data_directory = r'F:\Data'
+    # PhaseNet or EQTransformer, weights is a pretrained name or a model.save() path
+    model_type = 'PhaseNet'
+    model_weights = 'original'
+    # Integer decimation before windowing, 1 feeds the raw samples
+    decimation_factor = 1
+    # HDF5 store built by `python waveform_store.py <data> <store.h5>`, samples are read out of it
+    # instead of decoding .mseed. None reads the .mseed files
+    waveform_store_path = None
+    # Folder for memory-mapped .npy copies of decoded files so later reads skip mseed parsing, None disables them
+    npy_cache_dir = None
+    use_waveform_store(waveform_store_path)
+    use_npy_cache(npy_cache_dir)
+    print(f"Starting seismic data processing in {data_directory}")
+    deep_learning_picker(data_directory, model_name=model_type, weights=model_weights,
+                         torch_threads=os.cpu_count(), decimate=decimation_factor)
+    print("\nAll seismic picking operations completed.")
@@ -0,0 +1,112 @@
+import os
+import sys
+from functools import partial
+from pathlib import Path
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from waveform_io import scan_corpus, read_stream, use_waveform_store, use_npy_cache
+from waveform_filter import read_filtered, use_filter_cache
+from automatic_manual_marking import noise_stream_picks
+from automatic_manual_AR_Marking import get_full_path_components, sta_lta_stream_picks, aic_stream_picks
+
+# A picker plugin is a module-level function
+#     picker(raw_traces, traces, label_names, step) -> list of picks, -1 for no pick
+# raw_traces are the samples as read, traces the shared preprocessed copies
+# (demeaned, or bandpassed through waveform_filter) with one of their samples
+# every step raw samples. Picks are returned on the raw sample axis. Bind
+# parameters with functools.partial so the plugin can be sent to worker
+# processes, and register it below with the csv its picks are written to.
+PICKERS = {
+    'noise': (partial(noise_stream_picks, n_initial_samples=100000), 'p_picks_manual_noise.csv'),
+    'sta_lta': (partial(sta_lta_stream_picks, sta_win=200, lta_win=7500, threshold_on=12, threshold_off=0.3),
+                'p_picks_sta_lta.csv'),
+    'aic': (partial(aic_stream_picks, aic_window=(2000, 2000)), 'p_picks_aic.csv'),
+}
+
+
+def preprocess_stream(full_path, st, filter_params=None):
+    """
+    Demeaned copy of st, or its cached bandpassed copy when filter_params is given.
+    """
+    if filter_params:
+        return read_filtered(full_path, filter_params, st)
+    st = st.copy()
+    st.detrend("demean")
+    return st
+
+
+def pick_all(full_path, pickers, filter_params=None):
+    """
+    Reads one file once and runs every picker on it, runs inside a worker
+    process. Returns (label names, {picker name: picks}, failures).
+    """
+    root_dir, file_name = os.path.split(full_path)
+    _, exp_name, run_num, event_id, _ = get_full_path_components(root_dir, file_name)
+    st = read_stream(full_path)
+    label_names = [f'p_picks_{exp_name}_{run_num}_{event_id}_trace{i+1}' for i in range(len(st))]
+    raw_traces = [tr.data for tr in st]
+    traces = [tr.data for tr in preprocess_stream(full_path, st, filter_params)]
+    step = filter_params.get('decimate', 1) if filter_params else 1
+
+    picks, failures = {}, []
+    for name, (picker, _) in pickers.items():
+        try:
+            picks[name] = list(picker(raw_traces, traces, label_names, step))
+        except Exception as e:
+            failures.append((f'{name} on {full_path}', str(e)))
+            picks[name] = [-1] * len(label_names)
+    return label_names, picks, failures
+
+
+def run_pickers(path, pickers=None, filter_params=None, workers=None):
+    """
+    Runs every registered picker over the corpus in a single read of each file
+    and writes one Name,marked_point csv per picker. Returns the failures.
+    """
+    pickers = PICKERS if pickers is None else pickers
+    all_label_names = []
+    all_picks = {name: [] for name in pickers}
+    failures = []
+
+    print(f"Running {', '.join(pickers)} pickers over {path}")
+    for full_path, result, error in scan_corpus(path, partial(pick_all, pickers=pickers, filter_params=filter_params), workers):
+        if error is not None:
+            print(f"[ERROR] Failed to read {full_path}: {error}")
+            failures.append((full_path, error))
+            continue
+        label_names, picks, file_failures = result
+        all_label_names.extend(label_names)
+        for name in pickers:
+            all_picks[name].extend(picks[name])
+        failures.extend(file_failures)
+        print(f"Finished processing {os.path.basename(full_path)}")
+
+    for name, (_, output_csv_path) in pickers.items():
+        labels_df = pd.DataFrame({'Name': all_label_names, 'marked_point': all_picks[name]})
+        labels_df.to_csv(output_csv_path, index=False)
+        print(f"{name} picks saved to {output_csv_path}")
+    if failures:
+        print(f"{len(failures)} failures:")
+        for name, error in failures:
+            print(f"  {name}: {error}")
+    return failures
+
+
+if __name__ == "__main__":
+    data_directory = r'F:\Data'
+    # Bandpass before picking, e.g. {'freqmin': 20e3, 'freqmax': 200e3}, None picks on demeaned data
+    picking_filter = None
+    # HDF5 store built by `python waveform_store.py <data> <store.h5>`, samples are read out of it
+    # instead of decoding .mseed. None reads the .mseed files
+    waveform_store_path = None
+    # Folder for memory-mapped .npy copies of decoded files so later reads skip mseed parsing, None disables them
+    npy_cache_dir = None
+    # Folder for filtered .npy copies shared by the pickers and the GUI, None filters on every run
+    filter_cache_dir = None
+    use_waveform_store(waveform_store_path)
+    use_npy_cache(npy_cache_dir)
+    use_filter_cache(filter_cache_dir)
+    print(f"Starting seismic data processing in {data_directory}")
+    run_pickers(data_directory, filter_params=picking_filter)
+    print("\nAll seismic picking operations completed.")
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+# marked_point value the pickers write when they have no pick
+NO_PICK = -1
+
+# --- Pick Files ---
+# label -> csv, the first one is the reference the residuals are taken against
+PICK_CSVS = {
+    'hand': 'p_picks_Data.csv',
+    'noise': 'p_picks_manual_noise.csv',
+    'sta': 'p_picks_sta_lta.csv',
+}
+# label -> (line colour, legend name)
+PICK_STYLES = {
+    'hand': ('r', 'Hand'),
+    'noise': ('g', 'Noise'),
+    'sta': ('b', 'STA/LTA'),
+}
+
+
+def pick_style(label, k):
+    """
+    (line colour, legend name) of picker label, the k-th column of a pick set.
+    """
+    return PICK_STYLES.get(label, (f'C{k + 1}', label))
+
+
+def load_picks(pick_csvs, how='inner'):
+    """
+    Joins any number of Name,marked_point csvs on Name in one pass.
+
+    pick_csvs maps a label to a csv path, e.g. {'hand': 'p_picks_Data.csv'}.
+    Returns a DataFrame with Name and one marked_point_<label> column per csv,
+    in pick_csvs order. how='inner' keeps names every csv has, 'outer' keeps
+    all of them with NO_PICK where a csv has no row. A name repeated within a
+    csv keeps its last row.
+    """
+    columns = []
+    for label, csv_path in pick_csvs.items():
+        picks = pd.read_csv(csv_path, usecols=['Name', 'marked_point'])
+        picks = picks.drop_duplicates('Name', keep='last').set_index('Name')['marked_point']
+        columns.append(picks.rename(f'marked_point_{label}'))
+    merged = pd.concat(columns, axis=1, join=how, sort=False)
+    merged = merged.fillna(NO_PICK).astype(np.int64)
+    return merged.rename_axis('Name').reset_index()
+
+
+def pick_matrix(merged, labels):
+    """
+    (traces, pickers) masked array of picks, NO_PICK entries masked.
+    """
+    picks = merged[[f'marked_point_{label}' for label in labels]].to_numpy(dtype=np.int64)
+    return np.ma.masked_equal(picks, NO_PICK)
+
+
+def pairwise_residuals(picks):
+    """
+    (traces, pickers, pickers) absolute differences between every pair of
+    pickers, masked where either pick is missing.
+    """
+    return np.ma.abs(picks[:, :, None] - picks[:, None, :])
+
+
+def max_residual(picks):
+    """
+    Largest pairwise residual per trace, which is the spread between the
+    latest and earliest pick. Masked where fewer than two pickers picked.
+    """
+    spread = picks.max(axis=1) - picks.min(axis=1)
+    enough = np.ma.count(picks, axis=1) >= 2
+    return np.ma.masked_where(~enough, spread)
+
+
+def residuals_against(picks, reference=0):
+    """
+    (traces, pickers) signed residual of every picker against column
+    reference (the hand picks), masked where either pick is missing.
+    """
+    return picks - picks[:, reference:reference + 1]
+
+
+def flag_mismatches(merged, labels, threshold=100):
+    """
+    Adds a max_residual column (NaN with fewer than two picks) and returns the
+    rows above threshold, index reset.
+    """
+    residual = max_residual(pick_matrix(merged, labels))
+    merged['max_residual'] = residual.astype(np.float64).filled(np.nan)
+    return merged[merged['max_residual'] > threshold].reset_index(drop=True)
+
+
+def residual_summary(merged, labels, reference=0):
+    """
+    Count, mean, median, std and mean absolute residual of every picker
+    against the reference picker, over traces where both picked.
+    """
+    residuals = residuals_against(pick_matrix(merged, labels), reference)
+    rows = []
+    for k, label in enumerate(labels):
+        if k == reference:
+            continue
+        r = residuals[:, k].compressed().astype(np.float64)
+        rows.append({
+            'picker': label,
+            'against': labels[reference],
+            'count': len(r),
+            'mean': r.mean() if len(r) else np.nan,
+            'median': np.median(r) if len(r) else np.nan,
+            'std': r.std() if len(r) else np.nan,
+            'mae': np.abs(r).mean() if len(r) else np.nan,
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,268 @@
+import html
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from waveform_io import build_name_index, trace_chunk_sources, pick_window, use_waveform_store, use_npy_cache
+from residual_engine import (NO_PICK, PICK_CSVS, pick_style, load_picks, flag_mismatches,
+                             pick_matrix, residuals_against, residual_summary)
+
+
+# --- Figures ---
+# Each render function draws on its own Figure (no pyplot state) so they can
+# run side by side in worker processes, and returns the files it wrote.
+def render_histograms(out_path, title, reference, residuals, hist_range=5000, bins=100):
+    """
+    Overlaid histograms of every picker's residual against the reference
+    picker, residuals is {label: (column, values)}. Values beyond
+    +-hist_range samples are counted in the edge bins.
+    """
+    fig = Figure(figsize=(6, 3.5))
+    ax = fig.subplots()
+    edges = np.linspace(-hist_range, hist_range, bins + 1)
+    for label, (k, values) in residuals.items():
+        colour, legend_name = pick_style(label, k)
+        ax.hist(np.clip(values, -hist_range, hist_range), bins=edges, histtype='step',
+                color=colour, label=f'{legend_name} (n={len(values)})')
+    ax.set_title(title, fontsize=10)
+    ax.set_xlabel(f'Residual against {reference} pick (samples)')
+    ax.set_ylabel('Traces')
+    ax.legend(fontsize=8)
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=100)
+    return [out_path]
+
+
+def render_scatter(out_path, title, reference, picks):
+    """
+    One panel per picker of its picks against the reference picks, picks is
+    {label: (column, reference values, values)} over traces where both picked.
+    """
+    fig = Figure(figsize=(3.5 * max(len(picks), 1), 3.5))
+    axes = fig.subplots(1, max(len(picks), 1), squeeze=False)[0]
+    for ax, (label, (k, x, y)) in zip(axes, picks.items()):
+        colour, legend_name = pick_style(label, k)
+        ax.scatter(x, y, s=2, alpha=0.3, color=colour, rasterized=True)
+        if len(x):
+            lim = [min(x.min(), y.min()), max(x.max(), y.max())]
+            ax.plot(lim, lim, 'k--', lw=0.8)
+        ax.set_xlabel(f'{reference} pick (samples)')
+        ax.set_ylabel(f'{legend_name} pick (samples)')
+    fig.suptitle(title, fontsize=10)
+    fig.tight_layout()
+    fig.savefig(out_path, dpi=100)
+    return [out_path]
+
+
+def render_thumbnails(full_path, rows, labels, pad=2000):
+    """
+    Waveform thumbnails of traces in full_path cropped to pad samples around
+    their earliest and latest pick. rows is [(out_path, name, trace_number,
+    sampling_rate, max_residual, picks in labels order)]. Only the cropped
+    range is read when the waveform store is enabled, otherwise the file is
+    decoded once for all its rows.
+    """
+    sources = trace_chunk_sources(full_path)
+    written = []
+    for out_path, name, trace_number, sampling_rate, max_residual, picks in rows:
+        _, read_chunk = sources[trace_number]
+        start, stop = pick_window(picks, pad)
+        data = read_chunk(start, stop)
+        t = (start + np.arange(len(data))) / sampling_rate
+
+        fig = Figure(figsize=(4.5, 2.4))
+        ax = fig.subplots()
+        ax.plot(t, data, lw=0.6, color='0.3')
+        for k, (label, pick) in enumerate(zip(labels, picks)):
+            if pick == NO_PICK:
+                continue
+            colour, legend_name = pick_style(label, k)
+            ax.axvline(pick / sampling_rate, color=colour, lw=1, label=legend_name)
+        ax.set_title(f'{name} | residual {max_residual:.0f}', fontsize=7)
+        ax.tick_params(labelsize=6)
+        ax.set_xlabel('Time (s)', fontsize=7)
+        ax.legend(fontsize=6, loc='upper left')
+        fig.tight_layout()
+        fig.savefig(out_path, dpi=80)
+        written.append(out_path)
+    return written
+
+
+# --- Process Pool ---
+def run_jobs(jobs, workers=None):
+    """
+    Runs (function, args) jobs across a process pool and returns the files
+    they wrote. A failed job is reported and skipped. workers=1 renders in
+    this process.
+    """
+    workers = workers or os.cpu_count() or 1
+    written = []
+    if workers == 1:
+        results = []
+        for function, args in jobs:
+            try:
+                results.append((function(*args), None))
+            except Exception as e:
+                results.append((None, e))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(function, *args) for function, args in jobs]
+            results = []
+            for future in futures:
+                try:
+                    results.append((future.result(), None))
+                except Exception as e:
+                    results.append((None, e))
+    for (function, args), (files, error) in zip(jobs, results):
+        if error is not None:
+            print(f"[ERROR] {function.__name__} failed for {args[0]}: {error}")
+            continue
+        written.extend(files)
+    return written
+
+
+# --- Report ---
+def _file_name(*parts):
+    return re.sub(r'[^\w.-]', '_', '_'.join(parts)) + '.png'
+
+
+def residual_report(path, pick_csvs=PICK_CSVS, output_dir='residual_report', threshold=100, worst_n=100,
+                    pad=2000, hist_range=5000, bins=100, workers=None, index_path='trace_locations.json'):
+    """
+    Renders a static html report of the merged pick set under output_dir.
+
+    The csvs are merged like the residual viewer does, residuals are taken
+    against the first csv in pick_csvs. path is the root data folder: the
+    persisted name index finds each trace's file, experiment and run. The
+    report holds residual histograms overall, per experiment and per run,
+    picker against reference scatter plots overall and per experiment, and
+    thumbnails of the worst_n traces by max residual, all rendered across
+    workers processes. Returns the path of index.html.
+    """
+    labels = list(pick_csvs)
+    reference = pick_style(labels[0], 0)[1]
+    merged = load_picks(pick_csvs)
+    flagged = flag_mismatches(merged, labels, threshold)
+    print(f"{len(merged)} traces in every pick csv, {len(flagged)} with max residual > {threshold}")
+
+    locations = build_name_index(path, index_path, workers)
+    located = [locations.get(name) for name in merged['Name']]
+    folders = {loc[0]: (Path(loc[0]).parent.parent.name, Path(loc[0]).parent.name)
+               for loc in located if loc is not None}
+    merged['file'] = [loc[0] if loc is not None else None for loc in located]
+    merged['trace_number'] = [loc[1] if loc is not None else -1 for loc in located]
+    merged['sampling_rate'] = [loc[2] if loc is not None else np.nan for loc in located]
+    merged['experiment'] = [folders[loc[0]][0] if loc is not None else 'unlocated' for loc in located]
+    merged['run'] = [folders[loc[0]][1] if loc is not None else 'unlocated' for loc in located]
+
+    figure_dir = os.path.join(output_dir, 'figures')
+    os.makedirs(figure_dir, exist_ok=True)
+    picks = pick_matrix(merged, labels)
+    residuals = residuals_against(picks)
+
+    def group_residuals(rows):
+        return {label: (k, residuals[rows, k].compressed())
+                for k, label in enumerate(labels) if k != 0}
+
+    def group_picks(rows):
+        group = {}
+        for k, label in enumerate(labels[1:], start=1):
+            both = ~np.ma.getmaskarray(residuals[rows, k])
+            group[label] = (k, picks[rows, 0].data[both], picks[rows, k].data[both])
+        return group
+
+    # --- Figure Jobs ---
+    jobs = []
+    sections = {'All traces': [], 'Per experiment': [], 'Per run': []}
+    all_rows = np.arange(len(merged))
+    hist_path = os.path.join(figure_dir, 'hist_all.png')
+    scatter_path = os.path.join(figure_dir, 'scatter_all.png')
+    jobs.append((render_histograms, (hist_path, 'All traces', reference, group_residuals(all_rows), hist_range, bins)))
+    jobs.append((render_scatter, (scatter_path, 'All traces', reference, group_picks(all_rows))))
+    sections['All traces'].append(('All traces', [hist_path, scatter_path]))
+
+    for experiment, rows in merged.groupby('experiment', sort=True).indices.items():
+        hist_path = os.path.join(figure_dir, _file_name('hist', experiment))
+        scatter_path = os.path.join(figure_dir, _file_name('scatter', experiment))
+        jobs.append((render_histograms, (hist_path, experiment, reference, group_residuals(rows), hist_range, bins)))
+        jobs.append((render_scatter, (scatter_path, experiment, reference, group_picks(rows))))
+        sections['Per experiment'].append((experiment, [hist_path, scatter_path]))
+
+    for (experiment, run), rows in merged.groupby(['experiment', 'run'], sort=True).indices.items():
+        hist_path = os.path.join(figure_dir, _file_name('hist', experiment, run))
+        title = f'{experiment} {run}'
+        jobs.append((render_histograms, (hist_path, title, reference, group_residuals(rows), hist_range, bins)))
+        sections['Per run'].append((title, [hist_path]))
+
+    worst = merged[merged['file'].notna()].nlargest(worst_n, 'max_residual')
+    thumbnails = []
+    for rank, (i, row) in enumerate(worst.iterrows()):
+        thumbnails.append((rank, row['file'], (
+            os.path.join(figure_dir, f'worst_{rank:05d}.png'), row['Name'], int(row['trace_number']),
+            row['sampling_rate'], row['max_residual'], [int(p) for p in picks.data[i]])))
+    by_file = {}
+    for rank, full_path, thumbnail in thumbnails:
+        by_file.setdefault(full_path, []).append(thumbnail)
+    for full_path, rows in by_file.items():
+        jobs.append((render_thumbnails, (full_path, rows, labels, pad)))
+
+    print(f"Rendering {len(jobs) - len(by_file) + len(thumbnails)} figures into {figure_dir}")
+    written = set(run_jobs(jobs, workers))
+
+    # --- HTML ---
+    def img(figure_path):
+        if figure_path not in written:
+            return ''
+        return f'<img src="{html.escape(os.path.relpath(figure_path, output_dir))}">'
+
+    parts = [
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Pick residual report</title>',
+        '<style>body{font-family:sans-serif} img{max-width:100%} .grid{display:flex;flex-wrap:wrap}'
+        ' .grid figure{margin:4px} table{border-collapse:collapse} td,th{padding:2px 8px}</style></head><body>',
+        '<h1>Pick residual report</h1>',
+        f'<p>{len(merged)} traces picked in every csv ({html.escape(", ".join(labels))}), '
+        f'{len(flagged)} with max residual above {threshold} samples, '
+        f'{int(merged["file"].isna().sum())} not found under {html.escape(str(path))}.</p>',
+        residual_summary(merged, labels).to_html(index=False, float_format=lambda v: f'{v:.1f}'),
+    ]
+    for section, entries in sections.items():
+        parts.append(f'<h2>{section}</h2>')
+        for title, figure_paths in entries:
+            if section != 'All traces':
+                parts.append(f'<h3>{html.escape(title)}</h3>')
+            parts.append(''.join(img(p) for p in figure_paths))
+    parts.append(f'<h2>Worst {len(thumbnails)} traces by max residual</h2><div class="grid">')
+    for rank, full_path, (figure_path, name, trace_number, _, max_residual, _) in thumbnails:
+        parts.append(f'<figure>{img(figure_path)}<figcaption>{rank + 1}. {html.escape(name)} | '
+                     f'residual {max_residual:.0f} | {html.escape(os.path.basename(full_path))} '
+                     f'trace {trace_number + 1}</figcaption></figure>')
+    parts.append('</div></body></html>')
+
+    report_path = os.path.join(output_dir, 'index.html')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(parts))
+    flagged.to_csv(os.path.join(output_dir, 'mismatches.csv'), index=False)
+    print(f"Report written to {report_path}")
+    return report_path
+
+
+if __name__ == "__main__":
+    data_directory = r'F:\Data'
+    # Processes rendering figures (and reading headers for the name index), None uses every core
+    report_workers = None
+    # HDF5 store built by `python waveform_store.py <data> <store.h5>`, samples are read out of it
+    # instead of decoding .mseed. None reads the .mseed files
+    waveform_store_path = None
+    # Folder for memory-mapped .npy copies of decoded files so later reads skip mseed parsing, None disables them
+    npy_cache_dir = None
+    use_waveform_store(waveform_store_path)
+    use_npy_cache(npy_cache_dir)
+    residual_report(data_directory, PICK_CSVS, output_dir='residual_report', threshold=100,
+                    worst_n=100, pad=2000, workers=report_workers)
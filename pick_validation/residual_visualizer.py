@@ -1,165 +1,252 @@
-import tkinter as tk
-from tkinter import filedialog, messagebox
-import os
-import re
-import numpy as np
-import pandas as pd
-from obspy import read
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import (
-    FigureCanvasTkAgg,
-    NavigationToolbar2Tk
-)
-
-# --- Load Pick Data ---
-hand_picks = pd.read_csv('p_picks_Data.csv')
-noise_picks = pd.read_csv('p_picks_manual_noise.csv')
-sta_picks = pd.read_csv('p_picks_sta_lta.csv')
-
-# --- Merge Picks and Compute Max Residual ---
-merged = hand_picks.merge(noise_picks, on='Name', suffixes=('_hand', '_noise'))
-merged = merged.merge(sta_picks, on='Name')
-merged.rename(columns={'marked_point': 'marked_point_sta'}, inplace=True)
-
-def calc_max_residual(row):
-    picks = [row['marked_point_hand'], row['marked_point_noise'], row['marked_point_sta']]
-    return max(abs(p1 - p2) for i, p1 in enumerate(picks) for j, p2 in enumerate(picks) if i < j)
-
-merged['max_residual'] = merged.apply(calc_max_residual, axis=1)
-filtered = merged[merged['max_residual'] > 100].reset_index(drop=True)
-
-print(f"Total mismatches with residual > 100: {len(filtered)}")
-
-class ResidualViewer:
-    def __init__(self, master):
-        self.master = master
-        self.master.title("Waveform Residual Viewer")
-        self.master.protocol("WM_DELETE_WINDOW", self.close_app)
-        self.index = 0
-
-        # --- Label Display ---
-        self.label = tk.Label(master, text="", font=("Helvetica", 10, "bold"))
-        self.label.pack(pady=5)
-
-        # --- Plot Frame ---
-        self.plot_frame = tk.Frame(master)
-        self.plot_frame.pack(fill="both", expand=True)
-
-        self.fig, self.ax = plt.subplots(figsize=(8, 3))
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self.plot_frame)
-        self.canvas.draw()
-        self.canvas.get_tk_widget().pack(fill="both", expand=True)
-
-        self.toolbar = NavigationToolbar2Tk(self.canvas, self.plot_frame)
-        self.toolbar.update()
-        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
-
-        # --- Control Buttons ---
-        self.btn_frame = tk.Frame(master)
-        self.btn_frame.pack(pady=5)
-
-        self.prev_btn = tk.Button(self.btn_frame, text="Prev", command=self.prev)
-        self.prev_btn.pack(side=tk.LEFT, padx=5)
-
-        self.next_btn = tk.Button(self.btn_frame, text="Next", command=self.next)
-        self.next_btn.pack(side=tk.LEFT, padx=5)
-
-        self.load_btn = tk.Button(self.btn_frame, text="Select root 'data' folder", command=self.select_folder)
-        self.load_btn.pack(side=tk.LEFT, padx=5)
-
-        self.folder = None
-        self.update_plot()
-
-    def close_app(self):
-        print("Closing application.")
-        self.master.destroy()
-        exit()
-
-    def select_folder(self):
-        self.folder = filedialog.askdirectory(title="Select root folder containing Exp_T folders")
-        print(f"Selected folder: {self.folder}")
-        self.update_plot()
-
-    def parse_path_from_name(self, name):
-        print(f"Parsing name: {name}")
-        match = re.search(r'Exp_(T\d+)_(Run\d+(?:_Traces)?)_EventID_(\d+)', name)
-        if not match:
-            print("Regex match failed.")
-            return None
-
-        exp, run, event = match.groups()
-        folder_path = os.path.join(self.folder, f"Exp_{exp}", run)
-        file_name = f"EventID_{event}_WindowSize_0.05s_Data.mseed"
-        full_path = os.path.join(folder_path, file_name)
-        print(f"Constructed path: {full_path}")
-        return full_path
-
-    def update_plot(self):
-        if self.folder is None or self.index >= len(filtered):
-            print("No folder selected or index out of range.")
-            return
-
-        row = filtered.iloc[self.index]
-        name = row['Name']
-        mseed_path = self.parse_path_from_name(name)
-
-        if not mseed_path or not os.path.isfile(mseed_path):
-            print(f"File not found: {mseed_path}")
-            messagebox.showwarning("File Not Found", f"Could not locate .mseed for: {name}")
-            return
-
-        basename = os.path.basename(mseed_path)
-        self.label.config(text=f"Viewing: {name} | Residual: {row['max_residual']:.1f} | File: {basename}")
-
-        try:
-            st = read(mseed_path)
-            print(f"Read {len(st)} trace(s) from {mseed_path}")
-
-            # Extract trace index from 'traceN'
-            trace_match = re.search(r'trace(\d+)', name)
-            trace_index = int(trace_match.group(1)) - 1 if trace_match else 0
-            print(f"Using trace index: {trace_index} from name: {name}")
-
-            if trace_index >= len(st):
-                print(f"Trace index {trace_index} out of range. Stream has {len(st)} traces.")
-                messagebox.showerror("Error", f"Trace index {trace_index} not found in file.")
-                return
-
-            tr = st[trace_index]
-            data = tr.data
-            t = np.arange(len(data)) / tr.stats.sampling_rate
-
-        except Exception as e:
-            print(f"Error reading waveform: {e}")
-            messagebox.showerror("Error", f"Failed to read waveform: {e}")
-            return
-
-        self.ax.clear()
-        self.ax.plot(t, data, label='Waveform', alpha=0.7)
-        self.ax.axvline(row['marked_point_hand'] / tr.stats.sampling_rate, color='r', label='Hand')
-        self.ax.axvline(row['marked_point_noise'] / tr.stats.sampling_rate, color='g', label='Noise')
-        self.ax.axvline(row['marked_point_sta'] / tr.stats.sampling_rate, color='b', label='STA/LTA')
-        self.ax.legend()
-        self.ax.set_title(f"{name}")
-        self.ax.set_xlabel("Time (s)")
-        self.ax.set_ylabel("Amplitude")
-        self.canvas.draw()
-
-    def next(self):
-        if self.index < len(filtered) - 1:
-            self.index += 1
-            print(f"Moving to next index: {self.index}")
-            self.update_plot()
-
-    def prev(self):
-        if self.index > 0:
-            self.index -= 1
-            print(f"Moving to previous index: {self.index}")
-            self.update_plot()
-
-
-if __name__ == "__main__":
-    root = tk.Tk()
-    root.geometry("1000x600")
-    viewer = ResidualViewer(root)
-    root.mainloop()
+import tkinter as tk
+from tkinter import filedialog, messagebox
+import os
+import queue
+import sys
+import threading
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_tkagg import (
+    FigureCanvasTkAgg,
+    NavigationToolbar2Tk
+)
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from waveform_io import StreamCache, build_name_index, read_trace, pick_window, use_waveform_store, use_npy_cache
+from prefetch import Prefetcher, neighbour_keys
+
+from residual_engine import NO_PICK, PICK_CSVS, pick_style, load_picks, flag_mismatches
+
+# Name -> (file, trace, sampling rate) index of the selected root, kept between sessions
+NAME_INDEX_PATH = 'trace_locations.json'
+# Processes reading headers while the index is built, None uses every core
+INDEX_WORKERS = None
+# The index is built on a worker thread that reports back to the Tk loop through a queue
+INDEX_POLL_MS = 100
+# Decoded streams kept in memory, mismatches often share an event file
+STREAM_CACHE_SIZE = 16
+# Rows of the mismatch table decoded ahead of / behind the current one
+PREFETCH_NEXT = 4
+PREFETCH_PREV = 1
+# Samples shown either side of the earliest and latest pick, None plots the whole
+# record. 'w' widens the window by WINDOW_GROW, 'e' toggles the whole record.
+WINDOW_SAMPLES = 2000
+WINDOW_GROW = 2
+# HDF5 store built by `python waveform_store.py <data> <store.h5>`, samples are read out of it
+# instead of decoding .mseed. None reads the .mseed files
+WAVEFORM_STORE_PATH = None
+# Folder for memory-mapped .npy copies of decoded files so later reads skip mseed parsing, None disables them
+NPY_CACHE_DIR = None
+
+
+def load_mismatches(pick_csvs=PICK_CSVS, threshold=100):
+    """
+    Merged picks of every csv in pick_csvs whose max residual exceeds threshold.
+    """
+    merged = load_picks(pick_csvs)
+    filtered = flag_mismatches(merged, list(pick_csvs), threshold)
+    print(f"Total mismatches with residual > {threshold}: {len(filtered)}")
+    return filtered
+
+
+def index_folder(folder, results):
+    """
+    Worker thread: builds the name index of folder and queues it for the Tk
+    loop. Never touches Tk itself.
+    """
+    try:
+        locations = build_name_index(folder, NAME_INDEX_PATH, INDEX_WORKERS)
+    except Exception as e:
+        results.put(('error', folder, str(e)))
+        return
+    results.put(('done', folder, locations))
+
+
+class ResidualViewer:
+    def __init__(self, master, filtered, labels):
+        self.master = master
+        self.filtered = filtered
+        self.labels = labels
+        self.master.title("Waveform Residual Viewer")
+        self.master.protocol("WM_DELETE_WINDOW", self.close_app)
+        self.index = 0
+
+        # --- Label Display ---
+        self.label = tk.Label(master, text="", font=("Helvetica", 10, "bold"))
+        self.label.pack(pady=5)
+
+        # --- Plot Frame ---
+        self.plot_frame = tk.Frame(master)
+        self.plot_frame.pack(fill="both", expand=True)
+
+        self.fig, self.ax = plt.subplots(figsize=(8, 3))
+        self.canvas = FigureCanvasTkAgg(self.fig, master=self.plot_frame)
+        self.canvas.draw()
+        self.canvas.get_tk_widget().pack(fill="both", expand=True)
+
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.plot_frame)
+        self.toolbar.update()
+        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
+
+        # --- Control Buttons ---
+        self.btn_frame = tk.Frame(master)
+        self.btn_frame.pack(pady=5)
+
+        self.prev_btn = tk.Button(self.btn_frame, text="Prev", command=self.prev)
+        self.prev_btn.pack(side=tk.LEFT, padx=5)
+
+        self.next_btn = tk.Button(self.btn_frame, text="Next", command=self.next)
+        self.next_btn.pack(side=tk.LEFT, padx=5)
+
+        self.load_btn = tk.Button(self.btn_frame, text="Select root 'data' folder", command=self.select_folder)
+        self.load_btn.pack(side=tk.LEFT, padx=5)
+
+        self.master.bind('<Key-w>', lambda event: self.widen_window())
+        self.master.bind('<Key-e>', lambda event: self.toggle_full_record())
+
+        self.folder = None
+        self.window_half = WINDOW_SAMPLES
+        self.locations = {}
+        self.index_queue = queue.Queue()
+        self.streams = StreamCache(STREAM_CACHE_SIZE)
+        self.prefetcher = Prefetcher(self.load_row, max_items=PREFETCH_NEXT + PREFETCH_PREV + 2)
+        self.update_plot()
+
+    def close_app(self):
+        print("Closing application.")
+        self.prefetcher.close()
+        self.master.destroy()
+        exit()
+
+    def select_folder(self):
+        folder = filedialog.askdirectory(title="Select root folder containing Exp_T folders")
+        print(f"Selected folder: {folder}")
+        if not folder:
+            self.folder = None
+            return
+        # the viewer stays responsive while headers are read, the buttons wait for the index
+        self.folder = None
+        self.set_buttons(tk.DISABLED)
+        self.label.config(text=f"Indexing {folder} ...")
+        threading.Thread(target=index_folder, args=(folder, self.index_queue), daemon=True).start()
+        self.master.after(INDEX_POLL_MS, self.poll_index)
+
+    def poll_index(self):
+        """
+        Runs on the Tk loop through master.after until the indexing thread
+        has queued its result.
+        """
+        try:
+            message = self.index_queue.get_nowait()
+        except queue.Empty:
+            self.master.after(INDEX_POLL_MS, self.poll_index)
+            return
+        self.set_buttons(tk.NORMAL)
+        if message[0] == 'error':
+            _, folder, error = message
+            self.label.config(text="")
+            messagebox.showerror("Error indexing folder", f"Unable to index {folder}, Error: {error}")
+            return
+        _, self.folder, self.locations = message
+        print(f"Indexed {len(self.locations)} traces under {self.folder}")
+        self.prefetcher.clear()
+        self.streams.clear()
+        self.update_plot()
+
+    def set_buttons(self, state):
+        for button in (self.prev_btn, self.next_btn, self.load_btn):
+            button.config(state=state)
+
+    def widen_window(self):
+        if self.window_half is None:
+            return
+        self.window_half *= WINDOW_GROW
+        print(f"Window widened to +-{self.window_half} samples")
+        self.prefetcher.clear()
+        self.update_plot()
+
+    def toggle_full_record(self):
+        self.window_half = WINDOW_SAMPLES if self.window_half is None else None
+        print("Showing the whole record" if self.window_half is None else f"Window +-{self.window_half} samples")
+        self.prefetcher.clear()
+        self.update_plot()
+
+    def load_row(self, index):
+        """
+        (first sample, samples, sampling rate) of row index of the mismatch
+        table, only the window around its picks unless the whole record is
+        shown. Called by the prefetch thread for the neighbouring rows.
+        """
+        row = self.filtered.iloc[index]
+        location = self.locations.get(row['Name'])
+        if location is None:
+            raise FileNotFoundError(row['Name'])
+        picks = [row[f'marked_point_{label}'] for label in self.labels]
+        start, stop = pick_window(picks, self.window_half)
+        data, sampling_rate = read_trace(location[0], location[1], start, stop, cache=self.streams)
+        return start or 0, data, sampling_rate
+
+    def update_plot(self):
+        if self.folder is None or self.index >= len(self.filtered):
+            print("No folder selected or index out of range.")
+            return
+
+        row = self.filtered.iloc[self.index]
+        name = row['Name']
+        location = self.locations.get(name)
+
+        if location is None or not os.path.isfile(location[0]):
+            print(f"File not found for: {name}")
+            messagebox.showwarning("File Not Found", f"Could not locate .mseed for: {name}")
+            return
+
+        mseed_path, trace_index, _ = location
+        basename = os.path.basename(mseed_path)
+        window = 'whole record' if self.window_half is None else f'+-{self.window_half} samples'
+        self.label.config(text=f"Viewing: {name} | Residual: {row['max_residual']:.1f} | File: {basename} | Window: {window}")
+
+        try:
+            start, data, sampling_rate = self.prefetcher.get(self.index)
+            print(f"Read {len(data)} samples of trace index {trace_index} from {mseed_path}")
+            t = (start + np.arange(len(data))) / sampling_rate
+
+        except Exception as e:
+            print(f"Error reading waveform: {e}")
+            messagebox.showerror("Error", f"Failed to read waveform: {e}")
+            return
+
+        self.ax.clear()
+        self.ax.plot(t, data, label='Waveform', alpha=0.7)
+        for k, label in enumerate(self.labels):
+            pick = row[f'marked_point_{label}']
+            if pick == NO_PICK:
+                continue
+            colour, legend_name = pick_style(label, k)
+            self.ax.axvline(pick / sampling_rate, color=colour, label=legend_name)
+        self.ax.legend()
+        self.ax.set_title(f"{name}")
+        self.ax.set_xlabel("Time (s)")
+        self.ax.set_ylabel("Amplitude")
+        self.canvas.draw()
+        self.prefetcher.schedule(neighbour_keys(self.index, len(self.filtered), PREFETCH_NEXT, PREFETCH_PREV))
+
+    def next(self):
+        if self.index < len(self.filtered) - 1:
+            self.index += 1
+            print(f"Moving to next index: {self.index}")
+            self.update_plot()
+
+    def prev(self):
+        if self.index > 0:
+            self.index -= 1
+            print(f"Moving to previous index: {self.index}")
+            self.update_plot()
+
+
+if __name__ == "__main__":
+    use_waveform_store(WAVEFORM_STORE_PATH)
+    use_npy_cache(NPY_CACHE_DIR)
+    root = tk.Tk()
+    root.geometry("1000x600")
+    viewer = ResidualViewer(root, load_mismatches(PICK_CSVS), list(PICK_CSVS))
+    root.mainloop()
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict, deque
+
+
+class Prefetcher:
+    """
+    Prepares items on a background thread into a bounded LRU cache.
+
+    load_item(key) does the slow work (decode, detrend, decimate). schedule()
+    replaces the pending queue and the set of wanted keys, so a jump cancels
+    work queued for the old position. A result finishing after a schedule()
+    is kept while its key is still wanted or get() is waiting for it, and
+    dropped after clear().
+    """
+    def __init__(self, load_item, max_items=12):
+        self.load_item = load_item
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._pending = deque()
+        self._wanted = set()
+        self._waiting = set()
+        self._in_flight = None
+        self._generation = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def get(self, key):
+        """
+        Returns the prepared item for key, waiting for the worker if it is
+        preparing that key right now and loading it on this thread otherwise.
+        """
+        with self._cond:
+            self._waiting.add(key)
+            while self._in_flight == key and key not in self._items:
+                self._cond.wait()
+            self._waiting.discard(key)
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+        item = self.load_item(key)
+        with self._cond:
+            self._store(key, item)
+        return item
+
+    def schedule(self, keys):
+        with self._cond:
+            self._wanted = set(keys)
+            self._pending = deque(k for k in keys if k not in self._items and k != self._in_flight)
+            self._cond.notify()
+
+    def clear(self):
+        with self._cond:
+            self._generation += 1
+            self._pending.clear()
+            self._wanted.clear()
+            self._items.clear()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def _store(self, key, item):
+        self._items[key] = item
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                key = self._pending.popleft()
+                generation = self._generation
+                self._in_flight = key
+            try:
+                item = self.load_item(key)
+            except Exception as e:
+                print(f"Prefetch failed for {key}: {e}")
+                item = None
+            with self._cond:
+                self._in_flight = None
+                keep = key in self._wanted or key in self._waiting
+                if item is not None and generation == self._generation and keep:
+                    self._store(key, item)
+                self._cond.notify_all()
+
+
+def neighbour_keys(index, n, n_next=3, n_prev=1):
+    """
+    Indices around index ordered by distance, next traces first.
+    """
+    keys = []
+    for d in range(1, max(n_next, n_prev) + 1):
+        if d <= n_next and index + d < n:
+            keys.append(index + d)
+        if d <= n_prev and index - d >= 0:
+            keys.append(index - d)
+    return keys
@@ -0,0 +1,36 @@
+import sys
+from pathlib import Path
+import numpy as np
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from trace_buffer import TraceBuffer
+
+
+def test_mixed_int_float_traces_promote_without_truncating():
+    ints = np.array([1, -2, 3], dtype=np.int32)
+    floats = np.array([0.25, -1.5], dtype=np.float32)
+    buffer = TraceBuffer()
+    buffer.append(ints, 'trace1')
+    buffer.append(floats, 'trace2')
+    buffer.append(ints * 2, 'trace3')
+
+    assert buffer.dtype == np.float64
+    np.testing.assert_array_equal(buffer[0], ints)
+    np.testing.assert_array_equal(buffer[1], floats)
+    np.testing.assert_array_equal(buffer[2], ints * 2)
+    np.testing.assert_array_equal(buffer.reduce(np.maximum), [3, 0.25, 6])
+
+
+def test_explicit_int_dtype_rejects_float_trace():
+    buffer = TraceBuffer(dtype=np.int32)
+    buffer.append(np.array([1, 2], dtype=np.int32))
+    with pytest.raises(ValueError):
+        buffer.append(np.array([0.5], dtype=np.float64))
+
+
+def test_explicit_float32_dtype_still_downcasts_float64():
+    buffer = TraceBuffer(dtype=np.float32)
+    buffer.append(np.array([0.5, 1.5], dtype=np.float64))
+    assert buffer.dtype == np.float32
+    np.testing.assert_array_equal(buffer[0], [0.5, 1.5])
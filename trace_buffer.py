@@ -0,0 +1,132 @@
+import numpy as np
+from waveform_io import scan_corpus, read_file_traces
+
+
+class TraceBuffer:
+    """
+    Ragged container holding every trace's samples back to back in one buffer.
+
+    buffer[i] is a zero-copy view of trace i, offsets[i]:offsets[i+1] its range
+    in samples, and names/sampling_rates/file_paths/trace_numbers are per-trace
+    metadata in the same order. Samples are stored as dtype (int32 keeps mseed
+    counts exact, float32 halves float64 data) and a trace that can't be cast
+    to it within its kind (float into int) raises ValueError. dtype=None starts
+    from the first trace's dtype and promotes the whole buffer when a later
+    trace needs a wider one, e.g. int32 then float32 gives float64. The buffer
+    grows by doubling so it can be filled while a scan is still running.
+    """
+    def __init__(self, dtype=None, capacity=0):
+        self._promote = dtype is None
+        self.dtype = np.dtype(dtype) if dtype is not None else None
+        self._samples = np.empty(capacity, dtype=self.dtype if self.dtype is not None else np.int32)
+        self._size = 0
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._sampling_rates = np.empty(0, dtype=np.float64)
+        self._trace_numbers = np.empty(0, dtype=np.int32)
+        self._count = 0
+        self.names = []
+        self.file_paths = []
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        if not -self._count <= i < self._count:
+            raise IndexError(f'trace {i} out of range for {self._count} traces')
+        i %= self._count
+        return self._samples[self._offsets[i]:self._offsets[i + 1]]
+
+    @property
+    def samples(self):
+        return self._samples[:self._size]
+
+    @property
+    def offsets(self):
+        return self._offsets[:self._count + 1]
+
+    @property
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    @property
+    def sampling_rates(self):
+        return self._sampling_rates[:self._count]
+
+    @property
+    def trace_numbers(self):
+        return self._trace_numbers[:self._count]
+
+    def append(self, data, name='', sampling_rate=np.nan, file_path='', trace_number=0):
+        data = np.asarray(data)
+        if self.dtype is None:
+            self.dtype = data.dtype
+            self._samples = self._samples.astype(self.dtype)
+        elif data.dtype != self.dtype:
+            if self._promote:
+                dtype = np.result_type(self.dtype, data.dtype)
+                if dtype != self.dtype:
+                    self.dtype = dtype
+                    self._samples = self._samples.astype(dtype)
+            elif not np.can_cast(data.dtype, self.dtype, 'same_kind'):
+                raise ValueError(f'{data.dtype} trace {name!r} can not be stored in a {self.dtype} buffer without truncating')
+        end = self._size + len(data)
+        if end > len(self._samples):
+            self._samples = self._grow(self._samples, max(end, 2 * len(self._samples)))
+        self._samples[self._size:end] = data
+        self._size = end
+
+        if self._count == len(self._sampling_rates):
+            capacity = max(1, 2 * self._count)
+            self._offsets = self._grow(self._offsets, capacity + 1)
+            self._sampling_rates = self._grow(self._sampling_rates, capacity)
+            self._trace_numbers = self._grow(self._trace_numbers, capacity)
+        self._offsets[self._count + 1] = end
+        self._sampling_rates[self._count] = sampling_rate
+        self._trace_numbers[self._count] = trace_number
+        self._count += 1
+        self.names.append(name)
+        self.file_paths.append(file_path)
+
+    def _grow(self, array, size):
+        grown = np.empty(size, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def trim(self):
+        """
+        Releases the spare capacity left by doubling once loading is finished.
+        """
+        self._samples = self._samples[:self._size].copy()
+        self._offsets = self._offsets[:self._count + 1].copy()
+        self._sampling_rates = self._sampling_rates[:self._count].copy()
+        self._trace_numbers = self._trace_numbers[:self._count].copy()
+
+    def reduce(self, ufunc):
+        """
+        Per-trace reduction over the whole buffer in one call, e.g.
+        reduce(np.maximum) or reduce(np.add) / lengths for every trace mean.
+        Sums accumulate in float64. Empty traces give 0.
+        """
+        dtype = np.float64 if ufunc is np.add else self.samples.dtype
+        result = np.zeros(self._count, dtype=dtype)
+        nonempty = self.lengths > 0
+        if nonempty.any():
+            result[nonempty] = ufunc.reduceat(self.samples, self.offsets[:-1][nonempty], dtype=dtype)
+        return result
+
+
+def load_trace_buffer(path, dtype=None, workers=None):
+    """
+    Decodes every trace under path into a TraceBuffer, names in the usual
+    p_picks_{exp}_{run}_{event}_traceN order.
+    """
+    buffer = TraceBuffer(dtype=dtype)
+    for full_path, result, error in scan_corpus(path, read_file_traces, workers):
+        if error is not None:
+            print(f"Skipped {full_path}: {error}")
+            continue
+        entries, traces, sampling_rates = result
+        for (_, trace_number, name, _), data, sampling_rate in zip(entries, traces, sampling_rates):
+            buffer.append(data, name, sampling_rate, full_path, trace_number)
+    buffer.trim()
+    return buffer
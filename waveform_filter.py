@@ -0,0 +1,113 @@
+import os
+import numpy as np
+from obspy import Stream, Trace
+from scipy.signal import butter, sosfilt, sosfiltfilt, decimate as decimate_samples
+from npy_cache import load_sidecar, write_sidecar
+from waveform_io import read_stream
+
+
+# filter_params is a dict passed around by the pickers and the GUI, e.g.
+#     {'freqmin': 20e3, 'freqmax': 200e3, 'order': 4, 'zerophase': True, 'decimate': 1}
+# freqmin/freqmax in Hz are required, the rest default to the values above.
+FILTER_DEFAULTS = {'order': 4, 'zerophase': True, 'decimate': 1}
+
+
+def filter_key(filter_params):
+    """
+    Folder name identifying one filter setting in the filtered trace cache.
+    """
+    p = dict(FILTER_DEFAULTS, **filter_params)
+    phase = 'zp' if p['zerophase'] else 'causal'
+    return f"bp_{p['freqmin']:g}-{p['freqmax']:g}Hz_o{p['order']}_{phase}_d{p['decimate']}"
+
+
+def filter_traces(traces, sampling_rate, filter_params):
+    """
+    Demeaned, bandpassed and optionally decimated float32 copies of traces.
+
+    Traces of equal length are stacked into one 2D array and filtered along
+    axis=1 with a single SOS design, so a stream costs one call per length.
+    """
+    p = dict(FILTER_DEFAULTS, **filter_params)
+    sos = butter(p['order'], [p['freqmin'], p['freqmax']], btype='band', fs=sampling_rate, output='sos')
+    filtered = [None] * len(traces)
+    by_length = {}
+    for i, data in enumerate(traces):
+        by_length.setdefault(len(data), []).append(i)
+
+    for length, rows in by_length.items():
+        stacked = np.stack([np.asarray(traces[i], dtype=np.float64) for i in rows])
+        stacked -= stacked.mean(axis=1, keepdims=True)
+        # sosfiltfilt needs a few filter lengths of padding, shorter traces stay unfiltered
+        if p['zerophase'] and length > 3 * (2 * len(sos) + 1):
+            stacked = sosfiltfilt(sos, stacked, axis=1)
+        elif not p['zerophase'] and length:
+            stacked = sosfilt(sos, stacked, axis=1)
+        if p['decimate'] > 1:
+            # the anti-alias filtfilt needs more than 27 samples, plain slicing below that
+            if length > 27:
+                stacked = decimate_samples(stacked, p['decimate'], axis=1, zero_phase=True)
+            else:
+                stacked = stacked[:, ::p['decimate']]
+        for row, i in enumerate(rows):
+            filtered[i] = stacked[row].astype(np.float32)
+    return filtered
+
+
+def filter_stream(st, filter_params):
+    """
+    Filtered copy of st, traces sharing a sampling rate are filtered together.
+    Sampling rates are divided by the decimation factor.
+    """
+    decimate = dict(FILTER_DEFAULTS, **filter_params)['decimate']
+    filtered = [None] * len(st)
+    for sampling_rate in {tr.stats.sampling_rate for tr in st}:
+        rows = [i for i, tr in enumerate(st) if tr.stats.sampling_rate == sampling_rate]
+        for i, data in zip(rows, filter_traces([st[i].data for i in rows], sampling_rate, filter_params)):
+            filtered[i] = data
+
+    traces = []
+    for tr, data in zip(st, filtered):
+        header = tr.stats.copy()
+        header.npts = len(data)
+        header.sampling_rate = tr.stats.sampling_rate / decimate
+        traces.append(Trace(data=data, header=header))
+    return Stream(traces)
+
+
+def use_filter_cache(cache_dir):
+    """
+    Keeps filtered streams as .npy sidecars under cache_dir/<filter key>/ so
+    pickers and the GUI reuse them instead of filtering again. Set in the
+    environment so worker processes see it too, None disables it.
+    """
+    if cache_dir:
+        os.environ['WAVEFORM_FILTER_CACHE'] = cache_dir
+    else:
+        os.environ.pop('WAVEFORM_FILTER_CACHE', None)
+
+
+def cached_filtered(full_path, filter_params):
+    """
+    Filtered stream of full_path from the filtered trace cache, None when the
+    cache is disabled or holds no current sidecar for it.
+    """
+    cache_dir = os.environ.get('WAVEFORM_FILTER_CACHE')
+    if not cache_dir:
+        return None
+    return load_sidecar(os.path.join(cache_dir, filter_key(filter_params)), full_path)
+
+
+def read_filtered(full_path, filter_params, st=None):
+    """
+    filter_stream of full_path through the filtered trace cache when it is
+    enabled. st is the already decoded stream, read here when None.
+    """
+    cached = cached_filtered(full_path, filter_params)
+    if cached is not None:
+        return cached
+    filtered = filter_stream(st if st is not None else read_stream(full_path), filter_params)
+    cache_dir = os.environ.get('WAVEFORM_FILTER_CACHE')
+    if cache_dir:
+        write_sidecar(os.path.join(cache_dir, filter_key(filter_params)), full_path, filtered)
+    return filtered
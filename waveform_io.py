@@ -0,0 +1,342 @@
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from obspy import read
+from npy_cache import load_sidecar, write_sidecar
+
+
+# --- Helper Function for Label Names ---
+def trace_label_name(full_path, trace_number):
+    """
+    Builds the p_picks_{exp}_{run}_{event}_traceN label used by every script
+    from the data/experiment_name/run_num/file.mseed folder layout.
+    """
+    p = Path(full_path)
+    run_num = p.parent.name
+    exp_name = p.parent.parent.name
+    parts = p.stem.split('_')
+    event_id = '_'.join(parts[:2])
+    return f'p_picks_{exp_name}_{run_num}_{event_id}_trace{trace_number + 1}'
+
+
+# --- Header-only Trace Index ---
+def list_waveform_files(path, sort_key=None):
+    """
+    Every file under path in os.walk order, the order all scripts assign labels in.
+    sort_key optionally sorts the files within each folder (e.g. natsort).
+    """
+    file_paths = []
+    for root_dir, sub_dirs, files in os.walk(path):
+        if sort_key is not None:
+            files = sorted(files, key=sort_key)
+        for file_name in files:
+            file_paths.append(os.path.join(root_dir, file_name))
+    return file_paths
+
+
+def index_file(full_path):
+    """
+    Reads only the headers of full_path and returns its trace index entries.
+    """
+    st = read(full_path, headonly=True)
+    return [(full_path, i, trace_label_name(full_path, i), tr.stats.npts) for i, tr in enumerate(st)]
+
+
+# --- Storage Backend ---
+# Point the WAVEFORM_STORE environment variable (or use_waveform_store) at an HDF5
+# store built by waveform_store.py to read samples out of it instead of decoding
+# .mseed. Scan workers inherit the variable.
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def use_waveform_store(store_path):
+    if store_path:
+        os.environ['WAVEFORM_STORE'] = store_path
+    else:
+        os.environ.pop('WAVEFORM_STORE', None)
+
+
+def active_store():
+    store_path = os.environ.get('WAVEFORM_STORE')
+    if not store_path:
+        return None
+    # forked workers open their own handle rather than sharing the parent's
+    key = (os.getpid(), store_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            from waveform_store import WaveformStore
+            store = _stores[key] = WaveformStore(store_path)
+    return store
+
+
+# Point WAVEFORM_NPY_CACHE (or use_npy_cache) at a folder to keep a memory-mapped
+# .npy sidecar of every decoded file there, later reads skip mseed parsing
+def use_npy_cache(cache_dir):
+    if cache_dir:
+        os.environ['WAVEFORM_NPY_CACHE'] = cache_dir
+    else:
+        os.environ.pop('WAVEFORM_NPY_CACHE', None)
+
+
+def read_stream(full_path):
+    """
+    Drop-in for obspy read(full_path) that goes through the HDF5 store and the
+    .npy sidecar cache when they are enabled. Sidecar traces are read-only
+    memory maps, copy before modifying samples in place.
+    """
+    store = active_store()
+    if store is not None:
+        st = store.read_stream(full_path)
+        if st is not None:
+            return st
+    cache_dir = os.environ.get('WAVEFORM_NPY_CACHE')
+    if cache_dir:
+        st = load_sidecar(cache_dir, full_path)
+        if st is not None:
+            return st
+    st = read(full_path)
+    if cache_dir:
+        write_sidecar(cache_dir, full_path, st)
+    return st
+
+
+def read_trace(full_path, trace_number, start=None, stop=None, cache=None):
+    """
+    Samples start:stop of one trace and its sampling rate. With a store only the
+    requested range is decompressed, otherwise the file is decoded and sliced,
+    through cache (a StreamCache) when given so repeated slices decode once.
+    """
+    store = active_store()
+    if store is not None:
+        result = store.read_trace(full_path, trace_number, start, stop)
+        if result is not None:
+            return result
+    st = cache.get(full_path) if cache is not None else read_stream(full_path)
+    tr = st[trace_number]
+    return tr.data[start:stop], tr.stats.sampling_rate
+
+
+def pick_window(picks, half_width):
+    """
+    (start, stop) sample range reaching half_width past the earliest and latest
+    pick, -1 entries ignored. (None, None), the whole record, when half_width
+    is None or nothing was picked.
+    """
+    valid = [p for p in picks if p >= 0]
+    if half_width is None or not valid:
+        return None, None
+    return max(min(valid) - half_width, 0), max(valid) + half_width
+
+
+def trace_chunk_sources(full_path):
+    """
+    One (npts, read_chunk) pair per trace of full_path, read_chunk(start, stop)
+    returning that slice of samples.
+
+    From the HDF5 store only the chunks a slice touches are decompressed and
+    sidecar traces are memory maps, so either way memory is set by the slice
+    size. Without them the file is decoded once and sliced.
+    """
+    store = active_store()
+    lengths = store.trace_lengths(full_path) if store is not None else None
+    if lengths is not None:
+        return [(npts, partial(_store_chunk, store, full_path, i)) for i, npts in enumerate(lengths)]
+    st = read_stream(full_path)
+    return [(tr.stats.npts, partial(_slice_chunk, tr.data)) for tr in st]
+
+
+def _store_chunk(store, full_path, trace_number, start, stop):
+    return store.read_trace(full_path, trace_number, start, stop)[0]
+
+
+def _slice_chunk(data, start, stop):
+    return data[start:stop]
+
+
+def read_file_traces(full_path):
+    """
+    Decodes full_path and returns its trace index entries, sample arrays and
+    sampling rates.
+    """
+    st = read_stream(full_path)
+    entries = [(full_path, i, trace_label_name(full_path, i), tr.stats.npts) for i, tr in enumerate(st)]
+    return entries, [tr.data for tr in st], [tr.stats.sampling_rate for tr in st]
+
+
+# --- Parallel Corpus Scan ---
+def _scan_file(read_file, full_path):
+    try:
+        return full_path, read_file(full_path), None
+    except Exception as e:
+        return full_path, None, str(e)
+
+
+def scan_corpus(path, read_file, workers=None, file_paths=None):
+    """
+    Runs read_file(full_path) on every file under path across a process pool.
+
+    Yields (full_path, result, error) in os.walk order whatever order the workers
+    finish in, so label order matches the sequential loops. error is None on
+    success and the exception text otherwise. read_file must be a module-level
+    function so it can be pickled, and callers must sit behind an
+    if __name__ == "__main__" guard on Windows. workers=1 reads in this process.
+    """
+    if file_paths is None:
+        file_paths = list_waveform_files(path)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for full_path in file_paths:
+            yield _scan_file(read_file, full_path)
+        return
+
+    # Only a few files per worker are in flight so decoded results don't pile up
+    max_pending = workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for full_path in file_paths:
+            pending.append(pool.submit(_scan_file, read_file, full_path))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class StreamCache:
+    """
+    LRU cache of decoded streams keyed by file path, holds at most max_streams.
+    Safe to share with a prefetch thread, decoding happens outside the lock.
+    """
+    def __init__(self, max_streams=16):
+        self.max_streams = max_streams
+        self._streams = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, full_path):
+        with self._lock:
+            st = self._streams.get(full_path)
+            if st is not None:
+                self._streams.move_to_end(full_path)
+                return st
+        st = read_stream(full_path)
+        with self._lock:
+            self._streams[full_path] = st
+            while len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+        return st
+
+    def clear(self):
+        with self._lock:
+            self._streams.clear()
+
+
+class LazyWaveforms:
+    """
+    Sequence view over a trace index, waveforms[i] decodes trace i on demand
+    through a StreamCache so memory stays bounded by the cache size.
+    """
+    def __init__(self, trace_index, cache=None):
+        self.trace_index = trace_index
+        self.cache = cache if cache is not None else StreamCache()
+
+    def __len__(self):
+        return len(self.trace_index)
+
+    def __getitem__(self, i):
+        full_path, trace_number, _, _ = self.trace_index[i]
+        return self.cache.get(full_path)[trace_number].data
+
+
+# --- Persisted Name -> Location Index ---
+# Duplicate labels listed when build_name_index warns about them
+DUPLICATES_SHOWN = 10
+
+
+def locate_file(full_path):
+    """
+    Reads only the headers of full_path and returns (label name, trace number,
+    sampling rate) for each of its traces.
+    """
+    st = read(full_path, headonly=True)
+    return [(trace_label_name(full_path, i), i, tr.stats.sampling_rate) for i, tr in enumerate(st)]
+
+
+def build_name_index(path, index_path=None, workers=None):
+    """
+    Maps every p_picks_..._traceN label under path to (full_path, trace_number,
+    sampling_rate).
+
+    With index_path the headers read are kept there as json together with each
+    file's size and mtime, so a later call for the same root only reads the
+    headers of new or changed files. Files that fail to read are left out and
+    tried again next time. A label found in more than one file is reported and
+    mapped to the file whose path sorts first.
+    """
+    file_paths = list_waveform_files(path)
+    root = os.path.abspath(path)
+    files = {}
+    if index_path:
+        try:
+            with open(index_path) as f:
+                saved = json.load(f)
+            if saved.get('root') == root:
+                files = saved['files']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    signatures = {}
+    stale = []
+    for full_path in file_paths:
+        try:
+            st = os.stat(full_path)
+        except OSError as e:
+            # removed or unreadable since the walk, left out like a file that fails to read
+            print(f"Skipped {full_path}: {e}")
+            continue
+        key = os.path.abspath(full_path)
+        signatures[key] = [st.st_size, st.st_mtime]
+        entry = files.get(key)
+        if entry is None or entry['signature'] != signatures[key]:
+            stale.append(full_path)
+    print(f"{len(signatures) - len(stale)} files unchanged since the last index, indexing {len(stale)}")
+
+    for full_path, traces, error in scan_corpus(None, locate_file, workers, stale):
+        key = os.path.abspath(full_path)
+        if error is not None:
+            print(f"Skipped {full_path}: {error}")
+            files.pop(key, None)
+            continue
+        files[key] = {'signature': signatures[key], 'traces': traces}
+
+    files = {key: files[key] for key in signatures if key in files}
+    if index_path:
+        tmp_path = f'{index_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'root': root, 'files': files}, f)
+        os.replace(tmp_path, index_path)
+
+    # files of one event under different stems share labels, the first path in
+    # sorted order wins so the choice doesn't depend on os.walk order
+    name_index = {}
+    duplicates = {}
+    for full_path in sorted(file_paths):
+        entry = files.get(os.path.abspath(full_path))
+        if entry is None:
+            continue
+        for name, trace_number, sampling_rate in entry['traces']:
+            if name in name_index:
+                duplicates.setdefault(name, [name_index[name][0]]).append(full_path)
+                continue
+            name_index[name] = (full_path, trace_number, sampling_rate)
+    if duplicates:
+        print(f"Warning: {len(duplicates)} labels appear in more than one file, using the first file of each:")
+        for name, paths in list(duplicates.items())[:DUPLICATES_SHOWN]:
+            print(f"  {name}: {', '.join(paths)}")
+        if len(duplicates) > DUPLICATES_SHOWN:
+            print(f"  ... and {len(duplicates) - DUPLICATES_SHOWN} more")
+    return name_index
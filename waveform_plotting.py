@@ -0,0 +1,111 @@
+import numpy as np
+
+
+# --- Level of Detail Decimation ---
+class MinMaxPyramid:
+    """
+    Min/max pyramid of a trace for drawing long waveforms at screen resolution.
+
+    Level k keeps the min and max of every block of base**k samples, view()
+    returns about 2 points per pixel on the original sample axis so picks read
+    off the plot still line up with the raw samples. step is the number of raw
+    samples per sample of data, for decimated traces.
+    """
+    def __init__(self, data, base=4, step=1):
+        self.data = np.asarray(data)
+        self.base = base
+        self.step = step
+        self.levels = []  # (block_size, mins, maxs)
+        mins = maxs = self.data
+        block_size = 1
+        while len(mins) > 2 * base:
+            mins = self._reduce(mins, np.minimum)
+            maxs = self._reduce(maxs, np.maximum)
+            block_size *= base
+            self.levels.append((block_size, mins, maxs))
+
+    def _reduce(self, values, ufunc):
+        starts = np.arange(0, len(values), self.base)
+        return ufunc.reduceat(values, starts)
+
+    def __len__(self):
+        return len(self.data) * self.step
+
+    def view(self, xlim, n_pixels):
+        """
+        Returns (x, y) to plot for the sample range xlim on an axes n_pixels wide.
+        Raw samples are returned once the range fits in 2 points per pixel.
+        """
+        n_pixels = max(int(n_pixels), 1)
+        lo = int(np.clip(np.floor(min(xlim) / self.step), 0, len(self.data)))
+        hi = int(np.clip(np.ceil(max(xlim) / self.step) + 1, lo, len(self.data)))
+        if hi - lo <= 2 * n_pixels:
+            return np.arange(lo, hi) * self.step, self.data[lo:hi]
+
+        # coarsest level that still has at least one block per pixel
+        block_size, mins, maxs = 1, self.data, self.data
+        for level in self.levels:
+            if (hi - lo) / level[0] < n_pixels:
+                break
+            block_size, mins, maxs = level
+
+        first = lo // block_size
+        last = -(-hi // block_size)
+        group = -(-(last - first) // n_pixels)
+        starts = np.arange(first, last, group)
+        bin_min = np.minimum.reduceat(mins[first:last], starts - first)
+        bin_max = np.maximum.reduceat(maxs[first:last], starts - first)
+
+        x = np.repeat(starts * block_size * self.step, 2)
+        y = np.empty(2 * len(starts), dtype=self.data.dtype)
+        y[0::2] = bin_min
+        y[1::2] = bin_max
+        return x, y
+
+
+def axes_pixel_width(ax):
+    return max(int(ax.get_window_extent().width), 1)
+
+
+# --- Blitting ---
+class BlitManager:
+    """
+    Redraws only the animated artists (cursor and pick lines) over a cached
+    background of the static figure, the waveform itself is rendered once per
+    full draw. With enabled=False every update falls back to draw_idle().
+    """
+    def __init__(self, canvas, animated_artists=(), enabled=True):
+        self.canvas = canvas
+        self.enabled = enabled
+        self.background = None
+        self.artists = []
+        for artist in animated_artists:
+            self.add_artist(artist)
+        self.cid = canvas.mpl_connect('draw_event', self.on_draw)
+
+    def add_artist(self, artist):
+        artist.set_animated(self.enabled)
+        self.artists.append(artist)
+
+    def on_draw(self, event):
+        if not self.enabled:
+            return
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self.artists:
+            self.canvas.figure.draw_artist(artist)
+
+    def update(self):
+        if not self.enabled:
+            self.canvas.draw_idle()
+            return
+        if self.background is None:
+            # the first full draw caches the background through on_draw
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self.background)
+        self._draw_animated()
+        self.canvas.blit(self.canvas.figure.bbox)
+        self.canvas.flush_events()
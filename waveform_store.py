@@ -0,0 +1,152 @@
+import os
+import sys
+import threading
+from pathlib import Path
+import h5py
+from obspy import read, Stream, Trace, UTCDateTime
+from waveform_io import list_waveform_files, scan_corpus
+
+# Samples per HDF5 chunk, reads only decompress the chunks a slice touches
+CHUNK_SAMPLES = 16384
+# lzf ships with h5py; gzip trades speed for size
+COMPRESSION = 'lzf'
+
+
+def store_key(full_path):
+    """
+    experiment/run/file stem key of an .mseed file in the data/experiment/run
+    layout. The whole stem is used so files of one event that differ only in
+    their suffix (e.g. WindowSize) get groups of their own.
+    """
+    p = Path(full_path)
+    return f'{p.parent.parent.name}/{p.parent.name}/{p.stem}'
+
+
+def _source_signature(full_path):
+    st = os.stat(full_path)
+    return st.st_size, st.st_mtime
+
+
+def _stored_for(group, full_path):
+    # the group must have been ingested from this very file, not one sharing its key
+    return group.attrs.get('source_path') == os.path.abspath(full_path)
+
+
+def _decode_mseed(full_path):
+    return read(full_path)
+
+
+# --- Ingest ---
+def ingest(data_root, store_path, workers=None):
+    """
+    Converts every waveform file under data_root into store_path, one chunked,
+    compressed dataset per trace at experiment/run/file stem/traceN. Files whose
+    size and mtime match what is already stored are skipped, so reruns only
+    ingest new or changed files.
+    """
+    written = 0
+    with h5py.File(store_path, 'a') as h5:
+        file_paths = []
+        for full_path in list_waveform_files(data_root):
+            group = h5.get(store_key(full_path))
+            if (group is not None and _stored_for(group, full_path)
+                    and (group.attrs['source_size'], group.attrs['source_mtime']) == _source_signature(full_path)):
+                continue
+            file_paths.append(full_path)
+        print(f"Ingesting {len(file_paths)} new or changed files into {store_path}")
+
+        for full_path, st, error in scan_corpus(data_root, _decode_mseed, workers, file_paths):
+            if error is not None:
+                print(f"Skipped {full_path}: {error}")
+                continue
+            key = store_key(full_path)
+            if key in h5:
+                del h5[key]
+            group = h5.create_group(key)
+            size, mtime = _source_signature(full_path)
+            group.attrs['source_path'] = os.path.abspath(full_path)
+            group.attrs['source_size'] = size
+            group.attrs['source_mtime'] = mtime
+            group.attrs['n_traces'] = len(st)
+            for i, tr in enumerate(st):
+                ds = group.create_dataset(
+                    f'trace{i+1}', data=tr.data,
+                    chunks=(max(min(CHUNK_SAMPLES, len(tr.data)), 1),),
+                    compression=COMPRESSION, shuffle=True)
+                ds.attrs['sampling_rate'] = tr.stats.sampling_rate
+                ds.attrs['starttime'] = str(tr.stats.starttime)
+                for field in ('network', 'station', 'location', 'channel'):
+                    ds.attrs[field] = tr.stats[field]
+            written += 1
+            print(f'Stored {full_path} as {key}')
+    print(f"Ingest complete, {written} files written to {store_path}")
+
+
+# --- Reader ---
+class WaveformStore:
+    """
+    Read side of an ingested store. Lookups go by the original .mseed path; an
+    event stored from a different source path, or whose source file has changed
+    since ingest, is treated as missing so callers fall back to decoding the file.
+    """
+    def __init__(self, store_path):
+        self.store_path = store_path
+        self._h5 = h5py.File(store_path, 'r')
+        self._lock = threading.Lock()
+
+    def _event_group(self, full_path):
+        group = self._h5.get(store_key(full_path))
+        if group is None or not _stored_for(group, full_path):
+            return None
+        if os.path.exists(full_path) and (group.attrs['source_size'], group.attrs['source_mtime']) != _source_signature(full_path):
+            return None
+        return group
+
+    def _header(self, ds):
+        header = {field: ds.attrs[field] for field in ('network', 'station', 'location', 'channel')}
+        header['sampling_rate'] = ds.attrs['sampling_rate']
+        header['starttime'] = UTCDateTime(ds.attrs['starttime'])
+        return header
+
+    def read_stream(self, full_path):
+        with self._lock:
+            group = self._event_group(full_path)
+            if group is None:
+                return None
+            traces = []
+            for i in range(group.attrs['n_traces']):
+                ds = group[f'trace{i+1}']
+                traces.append(Trace(data=ds[()], header=self._header(ds)))
+        return Stream(traces)
+
+    def read_trace(self, full_path, trace_number, start=None, stop=None):
+        """
+        Samples start:stop of one trace and its sampling rate, only the chunks
+        covering the slice are decompressed. None if the event is not stored.
+        """
+        with self._lock:
+            group = self._event_group(full_path)
+            if group is None or f'trace{trace_number+1}' not in group:
+                return None
+            ds = group[f'trace{trace_number+1}']
+            return ds[start:stop], ds.attrs['sampling_rate']
+
+    def trace_lengths(self, full_path):
+        """
+        Sample count of every stored trace of full_path, None if not stored.
+        """
+        with self._lock:
+            group = self._event_group(full_path)
+            if group is None:
+                return None
+            return [group[f'trace{i+1}'].shape[0] for i in range(group.attrs['n_traces'])]
+
+    def close(self):
+        self._h5.close()
+
+
+if __name__ == "__main__":
+    # python waveform_store.py <data folder> <store.h5>
+    data_directory = sys.argv[1] if len(sys.argv) > 1 else r'F:\Data'
+    store_file = sys.argv[2] if len(sys.argv) > 2 else 'waveforms.h5'
+    ingest(data_directory, store_file)